@@ -0,0 +1,201 @@
+# Copyright (c) 2008 Mikael Lind
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+"""Texture atlas of unit images.
+
+An atlas file is a header, a JSON index from image names to rectangles,
+and the raw RGBA pixels of the atlas image, so that it can be loaded with a
+single read. The index also keeps the keys of the sources that the images
+were made from, so that a stale atlas can be told from a current one.
+"""
+
+
+import json, struct
+
+try:
+    import pygame
+except ImportError:
+    pygame = None
+
+try:
+    import numpy
+    from pygame import surfarray
+except ImportError:
+    numpy = None
+
+
+MAGIC = 'HXAT'
+VERSION = 2
+HEADER = struct.Struct('<4sHIII')
+
+ATLAS_WIDTH = 1024
+ATLAS_PADDING = 1
+
+
+class AtlasError(Exception):
+    pass
+
+
+class Atlas(object):
+
+    """Named rectangles of a single surface."""
+
+    def __init__(self, surface, rects, sources=None):
+
+        """Initialize the atlas from a surface and a dictionary of
+        rectangles.
+
+        The rectangles are (x, y, width, height) tuples. The sources are a
+        dictionary from names to keys, such as hashes of the source files,
+        that the images were made from.
+        """
+
+        self.surface = surface
+        self.sources = dict(sources or {})
+        self.__rects = dict((name, pygame.Rect(rect))
+                            for name, rect in rects.iteritems())
+
+    def __contains__(self, name):
+        return name in self.__rects
+
+    def __iter__(self):
+        return iter(self.__rects)
+
+    def rect(self, name):
+
+        """Return the rectangle of the named image."""
+
+        return self.__rects[name]
+
+    def image(self, name):
+
+        """Return the named image as a subsurface of the atlas."""
+
+        return self.surface.subsurface(self.__rects[name])
+
+    def sprite(self, name):
+
+        """Return the atlas surface and the area of the named image, as
+        arguments for blitting it."""
+
+        return self.surface, self.__rects[name]
+
+
+def pack(sizes, width=ATLAS_WIDTH, padding=ATLAS_PADDING):
+
+    """Pack rectangles of the given sizes into shelves of the given width.
+
+    Return a dictionary from the names of the sizes to (x, y) positions,
+    and the total height. The rectangles are placed in order of decreasing
+    height, left to right along the shelves, with the padding between them.
+    """
+
+    positions = {}
+    x = y = shelf_height = 0
+    order = sorted(sizes, key=lambda name: (-sizes[name][1], name))
+    for name in order:
+        w, h = sizes[name]
+        if w > width:
+            raise ValueError('image too wide for the atlas: %s' % name)
+        if x and x + w > width:
+            x = 0
+            y += shelf_height + padding
+            shelf_height = 0
+        positions[name] = x, y
+        x += w + padding
+        shelf_height = max(shelf_height, h)
+    return positions, y + shelf_height
+
+
+def create_team_image(image, team_color, team_colorkey=(0, 255, 0)):
+
+    """Return a copy of the image with the team colorkey replaced."""
+
+    team_image = image.copy()
+    if numpy is not None:
+        pixels = surfarray.pixels3d(team_image)
+        mask = (pixels == team_colorkey).all(axis=2)
+        pixels[mask] = team_color
+        del pixels
+        return team_image
+    team_image.lock()
+    team_r, team_g, team_b = team_color
+    for x in xrange(image.get_width()):
+        for y in xrange(image.get_height()):
+            r, g, b, a = image.get_at((x, y))
+            if (r, g, b) == team_colorkey:
+                team_image.set_at((x, y), (team_r, team_g, team_b, a))
+    team_image.unlock()
+    return team_image
+
+
+def build_atlas(images, width=ATLAS_WIDTH, sources=None):
+
+    """Pack a dictionary of named surfaces into an atlas."""
+
+    sizes = dict((name, image.get_size())
+                 for name, image in images.iteritems())
+    positions, height = pack(sizes, width)
+    surface = pygame.Surface((width, max(height, 1)), pygame.SRCALPHA, 32)
+    surface.fill((0, 0, 0, 0))
+    rects = {}
+    for name, image in images.iteritems():
+        rects[name] = positions[name] + sizes[name]
+        surface.blit(image, positions[name])
+    return Atlas(surface, rects, sources)
+
+
+def write_atlas(path, atlas):
+
+    """Write an atlas to a file."""
+
+    rects = dict((name, tuple(atlas.rect(name))) for name in atlas)
+    index = json.dumps(dict(rects=rects, sources=atlas.sources),
+                       sort_keys=True)
+    width, height = atlas.surface.get_size()
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(index), width, height))
+        f.write(index)
+        f.write(pygame.image.tostring(atlas.surface, 'RGBA'))
+
+
+def read_atlas(path):
+
+    """Read an atlas from a file written by write_atlas.
+
+    The pixels are converted for fast blitting, so the display mode must
+    be set.
+    """
+
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:len(MAGIC)] != MAGIC or len(data) < HEADER.size:
+        raise AtlasError('not an atlas')
+    magic, version, index_size, width, height = HEADER.unpack_from(data)
+    if version != VERSION:
+        raise AtlasError('unsupported atlas version %d' % version)
+    offset = HEADER.size + index_size
+    if len(data) != offset + 4 * width * height:
+        raise AtlasError('truncated atlas')
+    index = json.loads(data[HEADER.size:offset])
+    surface = pygame.image.fromstring(data[offset:], (width, height), 'RGBA')
+    return Atlas(surface.convert_alpha(), index['rects'], index['sources'])
@@ -0,0 +1,401 @@
+# Copyright (c) 2008 Mikael Lind
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+from array import array
+
+
+# The cells of a footprint relative to its center, in the same order as
+# HexGrid.neighbors after the center itself.
+FOOTPRINT = (0, 0), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0)
+
+
+def _lock_state(owner, moving):
+
+    # Return whether a cell is locked, locked by a unit that stands still,
+    # and locked by a unit that cannot move at all.
+    if owner is None:
+        return 0, 0, 0
+    return 1, int(not moving), int(owner.speed is None)
+
+
+class CellLockMap(object):
+
+    """Dense cell locks for a bounded hex grid.
+
+    The owner of every cell inside the bounds is stored as an integer id in
+    a flat array, together with a parallel array of flags telling whether
+    the owner is moving, so that cells can be tested without hashing. Cells
+    outside of the bounds can never be locked.
+
+    For large footprints, the map also keeps clearance counts per cell: the
+    number of locked cells in the footprint centered on the cell, and how
+    many of those are locked by units that stand still or cannot move. The
+    counts are updated locally whenever a lock changes, so that a footprint
+    without locks can be accepted with a single lookup.
+    """
+
+    def __init__(self, bounds):
+
+        """Initialize the map.
+
+        The bounds are the lowest and highest cells of the map, as two (m, n)
+        tuples. Both are inside the map.
+        """
+
+        (min_m, min_n), (max_m, max_n) = bounds
+        self.__bounds = bounds
+        self.__min_m, self.__min_n = min_m, min_n
+        self.__width = max_m - min_m + 1
+        self.__height = max_n - min_n + 1
+        size = self.__width * self.__height
+        self.__owners = array('i', [0]) * size
+        self.__moving = bytearray(size)
+        self.__locked = bytearray(size)
+        self.__stationary = bytearray(size)
+        self.__static = bytearray(size)
+
+        # Offsets of the footprint cells in the flat arrays.
+        h = self.__height
+        self.__footprint_offsets = tuple(dm * h + dn for dm, dn in FOOTPRINT)
+
+        # Owner ids start at 1, so that 0 means that a cell is not locked.
+        self.__ids = {}
+        self.__units = [None]
+        self.__free_ids = []
+
+    def bounds(self):
+
+        """Return the lowest and highest cells of the map."""
+
+        return self.__bounds
+
+    def __contains__(self, cell):
+
+        """Test whether a cell is inside the map."""
+
+        return self.__index(cell) is not None
+
+    def owner(self, cell):
+
+        """Return the unit that has locked a cell, or None."""
+
+        index = self.__index(cell)
+        if index is None:
+            return None
+        return self.__units[self.__owners[index]]
+
+    def lockable(self, unit, cell, with_moving=False):
+
+        """Test whether a unit can lock a cell, and its neighbors if large.
+
+        Cells that are locked by the unit itself can be locked again. If
+        with_moving is true, so can cells that are locked by moving units.
+        """
+
+        m, n = cell
+        i, j = m - self.__min_m, n - self.__min_n
+        width, height = self.__width, self.__height
+        owners, moving = self.__owners, self.__moving
+        if unit.large:
+            if not (1 <= i < width - 1 and 1 <= j < height - 1):
+                return False
+            index = i * height + j
+            clearance = self.__stationary if with_moving else self.__locked
+            if not clearance[index]:
+                return True
+            unit_id = self.__ids.get(unit, 0)
+            for offset in self.__footprint_offsets:
+                owner = owners[index + offset]
+                if (owner and owner != unit_id
+                    and not (with_moving and moving[index + offset])):
+                    return False
+            return True
+        if not (0 <= i < width and 0 <= j < height):
+            return False
+        index = i * height + j
+        owner = owners[index]
+        return (not owner or owner == self.__ids.get(unit, 0)
+                or with_moving and moving[index] != 0)
+
+    def free(self, cell, large):
+
+        """Test whether a cell, and its neighbors if large, is inside the
+        map and not locked by a unit that cannot move."""
+
+        m, n = cell
+        i, j = m - self.__min_m, n - self.__min_n
+        if large:
+            return (1 <= i < self.__width - 1 and 1 <= j < self.__height - 1
+                    and not self.__static[i * self.__height + j])
+        if not (0 <= i < self.__width and 0 <= j < self.__height):
+            return False
+        owner = self.__units[self.__owners[i * self.__height + j]]
+        return owner is None or owner.speed is not None
+
+    def lock(self, unit, cells):
+
+        """Lock the given cells for a unit."""
+
+        unit_id = self.__ids.get(unit)
+        if unit_id is None:
+            if self.__free_ids:
+                unit_id = self.__free_ids.pop()
+                self.__units[unit_id] = unit
+            else:
+                unit_id = len(self.__units)
+                self.__units.append(unit)
+            self.__ids[unit] = unit_id
+        moving = 1 if unit.moving else 0
+        for cell in cells:
+            self.__set(cell, unit_id, moving)
+
+    def lock_all(self, unit_cells):
+
+        """Lock the cells of many units at once.
+
+        The argument is a sequence of (unit, cells) pairs, where none of the
+        cells is locked yet. This is faster than locking for one unit at a
+        time, since the clearance counts are updated in a single pass.
+        """
+
+        owners, moving_flags = self.__owners, self.__moving
+        locked, stationary, static = (self.__locked, self.__stationary,
+                                      self.__static)
+        min_m, min_n = self.__min_m, self.__min_n
+        width, height = self.__width, self.__height
+        units, ids = self.__units, self.__ids
+        for unit, cells in unit_cells:
+            unit_id = ids.get(unit)
+            if unit_id is None:
+                if self.__free_ids:
+                    unit_id = self.__free_ids.pop()
+                    units[unit_id] = unit
+                else:
+                    unit_id = len(units)
+                    units.append(unit)
+                ids[unit] = unit_id
+            moving = 1 if unit.moving else 0
+            _, is_stationary, is_static = _lock_state(unit, moving)
+            for m, n in cells:
+                i, j = m - min_m, n - min_n
+                owners[i * height + j] = unit_id
+                moving_flags[i * height + j] = moving
+                for dm, dn in FOOTPRINT:
+                    if 0 <= i + dm < width and 0 <= j + dn < height:
+                        index = (i + dm) * height + j + dn
+                        locked[index] += 1
+                        stationary[index] += is_stationary
+                        static[index] += is_static
+
+    def unlock(self, cells):
+
+        """Unlock the given cells."""
+
+        for cell in cells:
+            self.__set(cell, 0, 0)
+
+    def set_moving(self, unit, moving):
+
+        """Update the moving flags of the cells locked by a unit."""
+
+        flag = 1 if moving else 0
+        for cell in unit.cell_locks:
+            self.__set(cell, self.__owners[self.__index(cell)], flag)
+
+    def release(self, unit):
+
+        """Forget a unit that no longer locks any cells."""
+
+        unit_id = self.__ids.pop(unit, None)
+        if unit_id is not None:
+            self.__units[unit_id] = None
+            self.__free_ids.append(unit_id)
+
+    def __index(self, cell):
+        m, n = cell
+        i, j = m - self.__min_m, n - self.__min_n
+        if 0 <= i < self.__width and 0 <= j < self.__height:
+            return i * self.__height + j
+        return None
+
+    def __set(self, cell, owner, moving):
+        index = self.__index(cell)
+        units = self.__units
+        old_state = _lock_state(units[self.__owners[index]],
+                                self.__moving[index])
+        self.__owners[index] = owner
+        self.__moving[index] = moving
+        new_state = _lock_state(units[owner], moving)
+        if new_state == old_state:
+            return
+
+        # The cell is part of the footprints centered on itself and on its
+        # neighbors, since the footprint is symmetric.
+        locked, stationary, static = [new - old for new, old
+                                      in zip(new_state, old_state)]
+        m, n = cell
+        for dm, dn in FOOTPRINT:
+            index = self.__index((m + dm, n + dn))
+            if index is not None:
+                self.__locked[index] += locked
+                self.__stationary[index] += stationary
+                self.__static[index] += static
+
+
+class SparseCellLockMap(object):
+
+    """Cell locks for an unbounded hex grid, stored in dictionaries.
+
+    This has the same interface as CellLockMap, and keeps the same
+    clearance counts, leaving out cells with zero counts.
+    """
+
+    def __init__(self, grid):
+
+        """Initialize the map."""
+
+        self.__grid = grid
+        self.__owners = {}
+        self.__moving = {}
+        self.__locked = {}
+        self.__stationary = {}
+        self.__static = {}
+
+    def bounds(self):
+
+        """Return None, since the map is unbounded."""
+
+        return None
+
+    def __contains__(self, cell):
+
+        """Return True, since every cell is inside the map."""
+
+        return True
+
+    def owner(self, cell):
+
+        """Return the unit that has locked a cell, or None."""
+
+        return self.__owners.get(cell)
+
+    def lockable(self, unit, cell, with_moving=False):
+
+        """Test whether a unit can lock a cell, and its neighbors if large.
+
+        Cells that are locked by the unit itself can be locked again. If
+        with_moving is true, so can cells that are locked by moving units.
+        """
+
+        owners, moving = self.__owners, self.__moving
+        def lockable(cell):
+            owner = owners.get(cell)
+            return (owner is None or owner is unit
+                    or with_moving and moving[cell])
+        if not unit.large:
+            return lockable(cell)
+        clearance = self.__stationary if with_moving else self.__locked
+        return (cell not in clearance
+                or lockable(cell)
+                and all(lockable(n) for n in self.__grid.neighbors(cell)))
+
+    def free(self, cell, large):
+
+        """Test whether a cell, and its neighbors if large, is not locked by
+        a unit that cannot move."""
+
+        if large:
+            return cell not in self.__static
+        owner = self.__owners.get(cell)
+        return owner is None or owner.speed is not None
+
+    def lock(self, unit, cells):
+
+        """Lock the given cells for a unit."""
+
+        for cell in cells:
+            self.__set(cell, unit, unit.moving)
+
+    def lock_all(self, unit_cells):
+
+        """Lock the cells of many units at once.
+
+        The argument is a sequence of (unit, cells) pairs, where none of the
+        cells is locked yet.
+        """
+
+        owners, moving_flags = self.__owners, self.__moving
+        all_counts = self.__locked, self.__stationary, self.__static
+        for unit, cells in unit_cells:
+            moving = unit.moving
+            state = _lock_state(unit, moving)
+            for cell in cells:
+                owners[cell] = unit
+                moving_flags[cell] = moving
+                m, n = cell
+                for counts, delta in zip(all_counts, state):
+                    if delta:
+                        for dm, dn in FOOTPRINT:
+                            footprint = m + dm, n + dn
+                            counts[footprint] = counts.get(footprint, 0) + 1
+
+    def unlock(self, cells):
+
+        """Unlock the given cells."""
+
+        for cell in cells:
+            self.__set(cell, None, False)
+
+    def set_moving(self, unit, moving):
+
+        """Update the moving flags of the cells locked by a unit."""
+
+        for cell in unit.cell_locks:
+            self.__set(cell, self.__owners[cell], moving)
+
+    def release(self, unit):
+
+        """Do nothing, since units are stored directly."""
+
+    def __set(self, cell, owner, moving):
+        old_state = _lock_state(self.__owners.get(cell),
+                                self.__moving.get(cell, False))
+        if owner is None:
+            del self.__owners[cell]
+            del self.__moving[cell]
+        else:
+            self.__owners[cell] = owner
+            self.__moving[cell] = moving
+        new_state = _lock_state(owner, moving)
+        if new_state == old_state:
+            return
+        m, n = cell
+        for counts, new, old in zip((self.__locked, self.__stationary,
+                                     self.__static), new_state, old_state):
+            if new != old:
+                for dm, dn in FOOTPRINT:
+                    footprint = m + dm, n + dn
+                    count = counts.get(footprint, 0) + new - old
+                    if count:
+                        counts[footprint] = count
+                    else:
+                        del counts[footprint]
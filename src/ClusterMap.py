@@ -0,0 +1,202 @@
+# Copyright (c) 2008 Mikael Lind
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+from collections import deque
+
+from shortest_path import shortest_path
+
+
+ABSTRACT_PATH_LIMIT = 500
+
+
+class ClusterMap(object):
+
+    """Hierarchical abstraction of a hex grid for long distance searches.
+
+    The grid is divided into clusters, which are the regions of the given
+    region versions. Neighboring clusters are connected through entrances,
+    one pair of adjacent cells for every contiguous opening along their
+    border. The distances between the entrances of a cluster are cached
+    until the version of the cluster or one of its neighbors changes.
+    """
+
+    def __init__(self, grid, versions, passable):
+
+        """Initialize the map.
+
+        Arguments:
+
+          grid           - The hex grid.
+          versions       - The region versions that define the clusters.
+          passable(cell) - A function returning true if a cell can be
+                           entered, false otherwise.
+        """
+
+        self.__grid = grid
+        self.__versions = versions
+        self.__passable = passable
+        self.__clusters = {}
+        self.builds = 0
+
+    def __len__(self):
+
+        """Return the number of cached clusters."""
+
+        return len(self.__clusters)
+
+    def find_path(self, start, goal, passable_from_start,
+                  limit=ABSTRACT_PATH_LIMIT, debug=None):
+
+        """Find an abstract path from start to goal.
+
+        The returned path is a list of waypoints that excludes the start and
+        has at most one waypoint per cluster crossing. If the goal is not
+        reachable within the limit, the path leads to the waypoint closest to
+        the goal. passable_from_start(cell) is used instead of the map
+        passability inside the cluster of the start.
+        """
+
+        if self.__region(start) == self.__region(goal):
+            return [goal]
+        # The goal is often a locked cell, such as an attack target, so its
+        # cluster is crossed as if it were open and left to the refinement.
+        start_edges = self.__local_edges(start, passable_from_start)
+        goal_edges = self.__local_edges(goal, lambda cell: True)
+
+        edges_memo = {}
+        def edges(node):
+            result = edges_memo.get(node)
+            if result is None:
+                if node == start:
+                    result = dict(start_edges)
+                else:
+                    cluster = self.__cluster(self.__region(node))
+                    result = dict(cluster.get(node, ()))
+                if node in goal_edges:
+                    result[goal] = goal_edges[node]
+                edges_memo[node] = result
+            return result
+        def neighbors(node):
+            return edges(node).keys() if node != goal else ()
+        def cost(node, neighbor):
+            return edges(node)[neighbor]
+        def heuristic(node):
+            return self.__grid.cell_dist(node, goal)
+        return shortest_path(start, lambda node: node == goal, neighbors, cost,
+                             heuristic, limit=limit, debug=debug)
+
+    def __region(self, cell):
+        return self.__versions.region(cell)
+
+    def __bounds(self, region):
+        size = self.__versions.region_size()
+        m, n = region
+        return m * size, n * size, (m + 1) * size, (n + 1) * size
+
+    def __border_cells(self, region):
+        min_m, min_n, max_m, max_n = self.__bounds(region)
+        for m in xrange(min_m, max_m):
+            yield m, min_n
+            yield m, max_n - 1
+        for n in xrange(min_n + 1, max_n - 1):
+            yield min_m, n
+            yield max_m - 1, n
+
+    def __cluster(self, region):
+        entry = self.__clusters.get(region)
+        if entry is not None and self.__versions.current(entry[0]):
+            return entry[1]
+        regions = [region] + self.__neighbor_regions(region)
+        stamp = self.__versions.stamp_regions(regions)
+        edges = self.__build_cluster(region)
+        self.__clusters[region] = stamp, edges
+        self.builds += 1
+        return edges
+
+    def __neighbor_regions(self, region):
+        return list(self.__grid.neighbors(region))
+
+    def __build_cluster(self, region):
+        edges = {}
+        for neighbor_region in self.__neighbor_regions(region):
+            for cell, neighbor in self.__entrances(region, neighbor_region):
+                edges.setdefault(cell, {})[neighbor] = \
+                    self.__grid.neighbor_dist(cell, neighbor)
+        for cell in list(edges):
+            dists = self.__distances(cell, region, self.__passable)
+            for other in edges:
+                if other != cell and other in dists:
+                    edges[cell][other] = dists[other]
+        return edges
+
+    def __entrances(self, region, neighbor_region):
+
+        # Find the openings from the lower region to the higher one so that
+        # both clusters agree on the entrances between them.
+        low, high = sorted([region, neighbor_region])
+        pairs = []
+        for cell in self.__border_cells(low):
+            if self.__passable(cell):
+                for neighbor in self.__grid.neighbors(cell):
+                    if (self.__region(neighbor) == high
+                        and self.__passable(neighbor)):
+                        pairs.append((cell, neighbor))
+        pairs.sort()
+
+        # Use the middle pair of every contiguous run as the entrance.
+        runs = []
+        for pair in pairs:
+            if (runs and self.__grid.cell_dist(runs[-1][-1][0], pair[0]) <= 1
+                and self.__grid.cell_dist(runs[-1][-1][1], pair[1]) <= 1):
+                runs[-1].append(pair)
+            else:
+                runs.append([pair])
+        entrances = [run[len(run) // 2] for run in runs]
+        if region == low:
+            return entrances
+        else:
+            return [(neighbor, cell) for cell, neighbor in entrances]
+
+    def __local_edges(self, origin, passable):
+        region = self.__region(origin)
+        dists = self.__distances(origin, region, passable)
+        return dict((cell, dists[cell]) for cell in self.__cluster(region)
+                    if cell in dists and cell != origin)
+
+    def __distances(self, origin, region, passable):
+
+        # Breadth-first search from the origin, staying inside the region.
+        # The origin itself is always included, so that searches can start
+        # from a locked cell such as an attack target.
+        min_m, min_n, max_m, max_n = self.__bounds(region)
+        dists = {origin: 0}
+        queue = deque([origin])
+        while queue:
+            cell = queue.popleft()
+            for neighbor in self.__grid.neighbors(cell):
+                m, n = neighbor
+                if (min_m <= m < max_m and min_n <= n < max_n
+                    and neighbor not in dists and passable(neighbor)):
+                    dists[neighbor] = (dists[cell]
+                                       + self.__grid.neighbor_dist(cell,
+                                                                   neighbor))
+                    queue.append(neighbor)
+        return dists
@@ -0,0 +1,234 @@
+# Copyright (c) 2008 Mikael Lind
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+from heapq import heappop, heappush
+
+
+INFINITY = float('inf')
+REPLAN_RADIUS = 2
+
+
+class DStarLite(object):
+
+    """Incremental shortest path search on a hex grid.
+
+    This is D* Lite: the search runs backwards from the goal, so that its
+    state stays valid while the start moves along the path, and only the
+    part of the search that depends on changed cells is repaired when
+    replanning. The passability of each cell is remembered from the first
+    time it is needed until the cell is looked at again when replanning.
+    If region versions are given, every remembered cell in a region whose
+    version has changed is looked at again as well.
+    """
+
+    def __init__(self, grid, start, goal, passable, limit, versions=None):
+
+        """Initialize the search.
+
+        Arguments:
+
+          grid           - The hex grid.
+          start          - The starting cell.
+          goal           - The goal cell. It is always passable.
+          passable(cell) - A function returning true if a cell can be
+                           entered, false otherwise.
+          limit          - The maximum number of cells to expand for each
+                           search or repair.
+          versions       - Region versions that are bumped whenever the
+                           passability of cells in a region may change, or
+                           None.
+        """
+
+        self.__grid = grid
+        self.__start = self.__last = start
+        self.__goal = goal
+        self.__passable = passable
+        self.__limit = limit
+        self.__blocked = {}
+        self.__versions = versions
+        self.__regions = {}
+        self.__g = {}
+        self.__rhs = {goal: 0}
+        self.__heap = []
+        self.__km = 0
+        self.__count = 0
+        self.expansions = 0
+        self.__push(goal)
+
+    def goal(self):
+
+        """Return the goal cell."""
+
+        return self.__goal
+
+    def find_path(self):
+
+        """Return the shortest path from the start, or None if not found.
+
+        The returned path excludes the start.
+        """
+
+        if not self.__compute():
+            return None
+        path = []
+        cell = self.__start
+        while cell != self.__goal:
+            best, best_cost = None, INFINITY
+            for neighbor in self.__grid.neighbors(cell):
+                cost = self.__cost(cell, neighbor) + self.__g.get(neighbor,
+                                                                 INFINITY)
+                if cost < best_cost:
+                    best, best_cost = neighbor, cost
+            if best is None or len(path) > self.__limit:
+                return None
+            path.append(best)
+            cell = best
+        return path
+
+    def replan(self, start, cells, radius=REPLAN_RADIUS):
+
+        """Move the start and update changed cells, then find a path.
+
+        The given cells, the cells within the radius of the start and the
+        cells in changed regions are looked at again, and the search is
+        repaired where their passability has changed. Return the path as
+        find_path does.
+        """
+
+        if start != self.__start:
+            self.__km += self.__heuristic(self.__last, start)
+            self.__last = self.__start = start
+        cells = set(cells)
+        cells.update(self.__nearby_cells(start, radius))
+        cells.update(self.__changed_cells())
+        for cell in cells:
+            if cell in self.__blocked and cell != self.__goal:
+                blocked = not self.__passable(cell)
+                if blocked != self.__blocked[cell]:
+                    self.__blocked[cell] = blocked
+                    self.__update(cell)
+                    for neighbor in self.__grid.neighbors(cell):
+                        self.__update(neighbor)
+        return self.find_path()
+
+    def __nearby_cells(self, origin, radius):
+        cells = set([origin])
+        frontier = [origin]
+        for i in xrange(radius):
+            frontier = [neighbor for cell in frontier
+                        for neighbor in self.__grid.neighbors(cell)
+                        if neighbor not in cells]
+            cells.update(frontier)
+        return cells
+
+    def __changed_cells(self):
+        versions = self.__versions
+        if versions is None:
+            return ()
+        cells = []
+        for region, entry in self.__regions.iteritems():
+            stamp, region_cells = entry
+            if not versions.current(stamp):
+                cells.extend(region_cells)
+                entry[0] = versions.stamp_regions((region,))
+        return cells
+
+    def __is_blocked(self, cell):
+        blocked = self.__blocked.get(cell)
+        if blocked is None:
+            blocked = cell != self.__goal and not self.__passable(cell)
+            self.__blocked[cell] = blocked
+            if self.__versions is not None:
+                region = self.__versions.region(cell)
+                entry = self.__regions.get(region)
+                if entry is None:
+                    stamp = self.__versions.stamp_regions((region,))
+                    entry = self.__regions[region] = [stamp, []]
+                entry[1].append(cell)
+        return blocked
+
+    def __cost(self, a, b):
+        if self.__is_blocked(a) or self.__is_blocked(b):
+            return INFINITY
+        return self.__grid.neighbor_dist(a, b)
+
+    def __heuristic(self, a, b):
+        return self.__grid.cell_dist(a, b)
+
+    def __key(self, cell):
+        g = min(self.__g.get(cell, INFINITY), self.__rhs.get(cell, INFINITY))
+        return g + self.__heuristic(self.__start, cell) + self.__km, g
+
+    def __push(self, cell):
+        self.__count += 1
+        heappush(self.__heap, (self.__key(cell), self.__count, cell))
+
+    def __update(self, cell):
+        if cell != self.__goal:
+            rhs = INFINITY
+            if not self.__is_blocked(cell):
+                g = self.__g
+                for neighbor in self.__grid.neighbors(cell):
+                    neighbor_g = g.get(neighbor, INFINITY)
+                    if neighbor_g < rhs and not self.__is_blocked(neighbor):
+                        rhs = min(rhs, neighbor_g + self.__grid.neighbor_dist(
+                            cell, neighbor))
+            self.__rhs[cell] = rhs
+        if self.__g.get(cell, INFINITY) != self.__rhs.get(cell, INFINITY):
+            self.__push(cell)
+
+    def __compute(self):
+        g, rhs, heap = self.__g, self.__rhs, self.__heap
+        start = self.__start
+        expansions = 0
+        while heap:
+            key, num, cell = heap[0]
+            if g.get(cell, INFINITY) == rhs.get(cell, INFINITY):
+                # The cell was made consistent through a newer entry.
+                heappop(heap)
+                continue
+            start_key = self.__key(start)
+            if (key >= start_key
+                and g.get(start, INFINITY) == rhs.get(start, INFINITY)):
+                break
+            if expansions >= self.__limit:
+                return False
+            heappop(heap)
+            new_key = self.__key(cell)
+            if key < new_key:
+                self.__push(cell)
+            elif key > new_key:
+                # A newer entry with the right key is still in the heap.
+                continue
+            else:
+                expansions += 1
+                if g.get(cell, INFINITY) > rhs[cell]:
+                    g[cell] = rhs[cell]
+                    for neighbor in self.__grid.neighbors(cell):
+                        self.__update(neighbor)
+                else:
+                    g[cell] = INFINITY
+                    self.__update(cell)
+                    for neighbor in self.__grid.neighbors(cell):
+                        self.__update(neighbor)
+        self.expansions += expansions
+        return g.get(start, INFINITY) < INFINITY
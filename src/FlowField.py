@@ -0,0 +1,140 @@
+# Copyright (c) 2008 Mikael Lind
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+from collections import deque
+
+
+FLOW_FIELD_LIMIT = 20000
+
+
+class FlowField(object):
+
+    """Field of distances to a goal, shared by units moving there.
+
+    The field is built by a breadth-first search outwards from the goal, so
+    that any unit inside it can find its next cell by looking at the
+    distances of its neighbors. The search stops as soon as the field covers
+    the cells asked for, and is resumed when a cell outside it is asked for.
+    """
+
+    def __init__(self, grid, goal, passable, limit=FLOW_FIELD_LIMIT,
+                 blocked=None):
+
+        """Initialize the field.
+
+        Arguments:
+
+          grid           - The hex grid.
+          goal           - The goal cell. It is always part of the field,
+                           even if it is not passable.
+          passable(cell) - A function returning true if a cell can be
+                           entered, false otherwise.
+          limit          - The maximum number of cells in the field.
+          blocked(cell)  - An optional function returning true if a cell is
+                           taken by the unit at the goal. Such cells are
+                           passable for building the field, but cannot be
+                           entered, so reaching one of them arrives at the
+                           goal.
+        """
+
+        self.__grid = grid
+        self.__passable = passable
+        self.__limit = limit
+        self.__blocked = blocked
+        self.goal = goal
+        self.__dists = {goal: 0}
+        self.__queue = deque([goal])
+
+    def extend(self, cell):
+
+        """Extend the field until it covers the given cell, if possible.
+
+        Return true if the field was extended, false otherwise.
+        """
+
+        size = len(self.__dists)
+        dists = self.__dists
+        queue = self.__queue
+        while cell not in dists and queue and len(dists) < self.__limit:
+            current = queue.popleft()
+            for neighbor in self.__grid.neighbors(current):
+                if neighbor not in dists and self.__passable(neighbor):
+                    dists[neighbor] = (dists[current]
+                                       + self.__grid.neighbor_dist(current,
+                                                                   neighbor))
+                    queue.append(neighbor)
+        return len(dists) != size
+
+    def __contains__(self, cell):
+
+        """Test whether the given cell is part of the field."""
+
+        return cell in self.__dists
+
+    def __len__(self):
+
+        """Return the number of cells in the field."""
+
+        return len(self.__dists)
+
+    def cells(self):
+
+        """Return the cells in the field."""
+
+        return self.__dists.keys()
+
+    def dist(self, cell):
+
+        """Return the distance from the given cell to the goal."""
+
+        return self.__dists[cell]
+
+    def next_cells(self, cell):
+
+        """Return the neighbors that lead towards the goal, best first."""
+
+        dist = self.__dists[cell]
+        result = [(self.__dists[n], n) for n in self.__grid.neighbors(cell)
+                  if self.__dists.get(n, dist) < dist]
+        result.sort()
+        return [n for d, n in result]
+
+    def arrived(self, cell):
+
+        """Test whether a unit at the given cell has arrived at the goal.
+
+        That is if the cell is the goal, or if a neighbor towards the goal
+        is taken by the unit at the goal.
+        """
+
+        if cell == self.goal:
+            return True
+        return (self.__blocked is not None
+                and any(self.__blocked(n) for n in self.next_cells(cell)))
+
+    def side_cells(self, cell):
+
+        """Return the neighbors as far from the goal as the given cell."""
+
+        dist = self.__dists[cell]
+        return [n for n in self.__grid.neighbors(cell)
+                if self.__dists.get(n) == dist]
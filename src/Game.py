@@ -20,33 +20,123 @@
 
 
 from config.balance import damage_factors
+from config.tasks import Attack, Move
 from config.tech_tree import tech_tree
 from config.units import *
-from collections import defaultdict, deque
+from CellLockMap import CellLockMap, SparseCellLockMap
+from ClusterMap import ClusterMap
+from DStarLite import DStarLite, REPLAN_RADIUS
+from collections import defaultdict, deque, OrderedDict
+from FlowField import FlowField
 from Force import Force
 from geometry import rect_from_center_and_size, squared_dist
-from heapq import heappop, heappush
 from HexGrid import HexGrid
+from HexPathFinder import HexPathFinder
+from PathCache import PathCache, RegionVersions
 from ProximityGrid import ProximityGrid
 from shortest_path import shortest_path
+from snapshot import read_snapshot, write_snapshot
+from TaskQueue import TaskQueue
 from TechTree import TechTree
-import random
+import hashlib, random, time
 
 
 SHORTEST_PATH_LIMIT = 100
+REPLAN_LIMIT = 100
 
+# Paths to goals farther away than this are planned over clusters of cells
+# first, and then refined one cluster at a time.
+HIERARCHICAL_PATH_DIST = 16
+
+FLOW_FIELD_CACHE_SIZE = 16
+
+# Path requests are served until one of these budgets runs out, but at least
+# one request is served per update. A budget of None means no limit.
+PATH_TIME_BUDGET = 0.005
+PATH_NODE_BUDGET = 1000
+
+# Idle units that can attack look for enemies in range this often, and at
+# most this many of them per update. A budget of None means no limit.
+IDLE_SCAN_INTERVAL = 0.5
+IDLE_SCAN_BUDGET = 50
 
-class Game(object):
+
+class PathStats(object):
 
     def __init__(self):
+        self.backlog = 0
+        self.served = 0
+        self.served_last_update = 0
+        self.nodes_last_update = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def mean_latency(self):
+        return self.total_latency / self.served if self.served else 0.0
+
+    def add(self, latency):
+        self.served += 1
+        self.served_last_update += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+
+
+class Game(object):
+
+    def __init__(self, bounds=None, seed=None):
         self.time_step = None
         self.time = 0.0
+        self.skipped_ticks = 0
+
+        # Listeners are told about units that are added, moved or removed,
+        # through their unit_added, unit_moved and unit_removed methods.
+        self.listeners = []
+
+        # All randomness comes from this generator, so that a game with a
+        # given seed is reproducible. Such a game serves path requests
+        # within the node budget alone, since a time budget depends on the
+        # speed of the machine.
+        self.random = random.Random(seed)
         self.__grid = HexGrid()
         self.__path_queue = deque()
-        self.__task_queue = []
+        self.path_time_budget = PATH_TIME_BUDGET if seed is None else None
+        self.path_node_budget = PATH_NODE_BUDGET
+        self.path_stats = PathStats()
+        self.__path_finder = HexPathFinder(SHORTEST_PATH_LIMIT)
+        self.__lock_versions = RegionVersions()
+        self.path_cache = PathCache(self.__lock_versions)
+        self.__static_versions = RegionVersions()
+        self.cluster_maps = {}
+        for large in (False, True):
+            def passable(cell, large=large):
+                return self.__cell_locks.free(cell, large)
+            self.cluster_maps[large] = ClusterMap(self.__grid,
+                                                  self.__static_versions,
+                                                  passable)
+        self.__routes = {}
+        self.__flow_fields = OrderedDict()
+        self.task_queue = TaskQueue()
+        self.__task_entries = {}
+        self.__idle_queue = deque()
+        self.__idle_units = set()
+        self.idle_scan_interval = IDLE_SCAN_INTERVAL
+        self.idle_scan_budget = IDLE_SCAN_BUDGET
         self.units = set()
-        self.__proximity_grid = ProximityGrid(5)
-        self.__cell_locks = {}
+
+        # A bounded map, given by its lowest and highest cells, keeps its
+        # cell locks and proximity grid in dense arrays.
+        self.bounds = bounds
+        if bounds is None:
+            self.__proximity_grid = ProximityGrid(5)
+            self.__cell_locks = SparseCellLockMap(self.__grid)
+        else:
+            (min_m, min_n), (max_m, max_n) = bounds
+            points = [self.cell_to_point((m, n)) for m in (min_m, max_m)
+                      for n in (min_n, max_n)]
+            xs, ys = zip(*points)
+            self.__proximity_grid = ProximityGrid(5, ((min(xs), min(ys)),
+                                                      (max(xs), max(ys))))
+            self.__cell_locks = CellLockMap(bounds)
         self.tech_tree = tech_tree
         self.forces = defaultdict(Force)
         
@@ -54,31 +144,259 @@ class Game(object):
         self.time_step = time_step
         self.time += time_step
         self.__update_paths()
+        self.__update_idle_units()
         self.__update_tasks()
 
+    def fast_forward(self, time_step, max_ticks):
+
+        # Skip the ticks before the next one that has anything to do,
+        # advancing the time exactly as that many updates would.
+        if self.__path_queue or max_ticks <= 0:
+            return 0
+        next_times = [self.task_queue.next_time()]
+        if self.__idle_queue:
+            next_times.append(self.__idle_queue[0][0])
+        next_times = [t for t in next_times if t is not None]
+        next_time = min(next_times) if next_times else None
+        ticks = 0
+        game_time = self.time
+        while ticks < max_ticks:
+            tick_time = game_time + time_step
+            if next_time is not None and tick_time >= next_time:
+                break
+            game_time = tick_time
+            ticks += 1
+        if ticks:
+            self.time_step = time_step
+            self.time = game_time
+            self.path_stats.served_last_update = 0
+            self.path_stats.nodes_last_update = 0
+            self.skipped_ticks += ticks
+        return ticks
+
+    def state_hash(self):
+
+        # Hash everything that later updates depend on, with the units in
+        # the order of their cells, which no two units share.
+        state = [repr(self.time), len(self.__path_queue), len(self.task_queue),
+                 self.path_stats.served]
+        for unit in sorted(self.units, key=lambda unit: unit.cell):
+            tasks = [(type(task).__name__,
+                      getattr(task.update, '__name__', None))
+                     for task in unit.task_stack]
+            state.append((type(unit).__name__, unit.color, unit.cell,
+                          repr(unit.health), unit.moving,
+                          sorted(unit.cell_locks), tasks,
+                          len(unit.task_queue)))
+        return hashlib.md5(repr(state)).hexdigest()
+
+    def snapshot(self, path):
+
+        # Caches, routes and incremental planners are not saved, and are
+        # rebuilt as needed after a restore. Since they shape the paths
+        # that units take, a restored game only runs exactly like the
+        # original if the original calls clear_caches after the snapshot.
+        write_snapshot(path, {
+            'time': self.time,
+            'time_step': self.time_step,
+            'skipped_ticks': self.skipped_ticks,
+            'bounds': self.bounds,
+            'path_stats': self.path_stats,
+            'path_time_budget': self.path_time_budget,
+            'path_node_budget': self.path_node_budget,
+            'idle_scan_interval': self.idle_scan_interval,
+            'idle_scan_budget': self.idle_scan_budget,
+            'random_state': self.random.getstate(),
+            'units': sorted(self.units, key=lambda unit: unit.cell),
+            'owner': self.__cell_locks.owner,
+            'scheduled': [(entry[0], entry[1])
+                          for entry in self.task_queue.entries()],
+            'requests': [(request[3], request[2].im_self, request[2])
+                         for request in self.__path_queue
+                         if not request[-1]],
+            'idle': [(due, unit) for due, unit in self.__idle_queue
+                     if unit in self.__idle_units],
+        })
+
+    @classmethod
+    def restore(cls, path):
+        state = read_snapshot(path)
+        game = cls(state['bounds'])
+        game.time = state['time']
+        game.time_step = state['time_step']
+        game.skipped_ticks = state['skipped_ticks']
+        (game.path_stats.served, game.path_stats.total_latency,
+         game.path_stats.max_latency) = state['path_stats']
+        game.path_time_budget = state['path_time_budget']
+        game.path_node_budget = state['path_node_budget']
+        game.idle_scan_interval = state['idle_scan_interval']
+        game.idle_scan_budget = state['idle_scan_budget']
+        game.random.setstate(state['random_state'])
+        units = state['units']
+        game.units.update(units)
+        for unit in units:
+            game.forces[unit.color].add_unit(unit)
+        cell_to_point = game.cell_to_point
+        game.__proximity_grid.update(
+            (unit, rect_from_center_and_size(cell_to_point(unit.cell),
+                                             unit.size))
+            for unit in units)
+
+        # Cells that are locked by more than one unit go to their owner.
+        owned = state['owned']
+        game.__cell_locks.lock_all((unit, owned[unit]) for unit in units)
+        for unit in units:
+            for task in unit.task_stack:
+                task.init(game, unit)
+        for time, task in state['scheduled']:
+            game.__task_entries[task] = game.task_queue.push(time, task)
+        for time, task, set_path in state['requests']:
+            task.path_request = [task.unit, task.goal, set_path, time, False]
+            game.__path_queue.append(task.path_request)
+            game.path_stats.backlog += 1
+        for due, unit in state['idle']:
+            game.__idle_queue.append((due, unit))
+            game.__idle_units.add(unit)
+        return game
+
+    def clear_caches(self):
+
+        # Drop the state that snapshots leave out: cached paths, routes,
+        # flow fields and the incremental planners of replanning units,
+        # which plan from scratch on their next step.
+        self.path_cache.clear()
+        self.__routes.clear()
+        self.__flow_fields.clear()
+        for unit in self.units:
+            for task in unit.task_stack:
+                if isinstance(task, Move):
+                    task.planner = None
+
     def __update_paths(self):
-        while self.__path_queue and self.__path_queue[0][-1]:
-            self.__path_queue.popleft()
-        if self.__path_queue:
-            unit, goal, set_path, removed = self.__path_queue.popleft()
-            if not removed and unit:
-                def goal_func(cell):
-                    return cell == goal
-                def neighbors(cell):
-                    result = [n for n in self.__grid.neighbors(cell)
-                              if self.lockable_cell(unit, n, with_moving=True)]
-                    random.shuffle(result)
-                    return result
-                def heuristic(cell):
-                    return self.__grid.cell_dist(cell, goal)
-                path = shortest_path(unit.cell, goal_func, neighbors,
-                                     self.__grid.neighbor_dist,
-                                     heuristic, limit=SHORTEST_PATH_LIMIT)
-                set_path(path)
+        stats = self.path_stats
+        stats.served_last_update = stats.nodes_last_update = 0
+        if self.path_time_budget is not None:
+            deadline = time.time() + self.path_time_budget
+        while self.__path_queue:
+            if stats.served_last_update and (
+                self.path_time_budget is not None and time.time() >= deadline
+                or self.path_node_budget is not None
+                and stats.nodes_last_update >= self.path_node_budget):
+                break
+            path_request = self.__path_queue.popleft()
+            unit, goal, set_path, request_time, removed = path_request
+            if not removed:
+                self.remove_path_request(path_request)
+                if unit in self.units:
+                    path = self.__cached_path(unit, goal)
+                    stats.add(self.time - request_time)
+                    set_path(path)
+
+    def __cached_path(self, unit, goal):
+        def valid(path):
+            return all(self.lockable_cell(unit, cell, with_moving=True)
+                       for cell in path)
+        def passable(cell):
+            return self.lockable_cell(unit, cell, with_moving=True)
+        goal = self.__next_waypoint(unit, goal)
+        path = self.path_cache.get(unit.cell, goal, unit.large, valid,
+                                   passable)
+        if path is None:
+            path = self.__find_path(unit, goal)
+        return path
+
+    def __next_waypoint(self, unit, goal):
+        if self.__grid.cell_dist(unit.cell, goal) <= HIERARCHICAL_PATH_DIST:
+            self.__routes.pop(unit, None)
+            return goal
+
+        # Follow the planned route if the unit has reached one of its
+        # waypoints, or plan a new one.
+        route = self.__routes.get(unit)
+        if route is not None and route[0] == goal and unit.cell in route[1]:
+            waypoints = route[1]
+            while waypoints.popleft() != unit.cell:
+                pass
+        else:
+            def passable(cell):
+                return self.lockable_cell(unit, cell, with_moving=True)
+            def debug(nodes):
+                self.path_stats.nodes_last_update += len(nodes)
+            cluster_map = self.cluster_maps[unit.large]
+            waypoints = deque(cluster_map.find_path(unit.cell, goal, passable,
+                                                    debug=debug))
+            self.__routes[unit] = goal, waypoints
+
+        # Refine the route up to the first waypoint in another cluster.
+        region = self.__lock_versions.region(unit.cell)
+        for waypoint in waypoints:
+            if self.__lock_versions.region(waypoint) != region:
+                return waypoint
+        return goal
+
+    def __find_path(self, unit, goal):
+        def passable(cell):
+            return self.lockable_cell(unit, cell, with_moving=True)
+        finder = self.__path_finder
+        path = finder.find_path(unit.cell, goal, passable,
+                                limit=SHORTEST_PATH_LIMIT)
+        self.path_stats.nodes_last_update += finder.nodes()
+
+        # The path depends on the cells that were rejected as well as on
+        # those that were searched, and a large unit is rejected by locks
+        # on the neighbors of a cell.
+        cells = finder.cells()
+        blocked = finder.blocked_cells()
+        cells.extend(blocked)
+        if unit.large:
+            for cell in blocked:
+                cells.extend(self.__grid.neighbors(cell))
+        self.path_cache.put(unit.cell, goal, unit.large, path, cells, blocked)
+        return path
+
+    def __update_idle_units(self):
+
+        # Scan the idle units in the order they became idle. Units that
+        # found nothing are scanned again after the interval, which spreads
+        # the scans of units that became idle at the same time.
+        units = []
+        queue = self.__idle_queue
+        while queue and queue[0][0] <= self.time:
+            if (self.idle_scan_budget is not None
+                and len(units) >= self.idle_scan_budget):
+                break
+            unit = queue.popleft()[1]
+            self.__idle_units.discard(unit)
+            if unit in self.units and not unit.task_stack:
+                units.append(unit)
+        for unit, target in zip(units, self.__find_targets(units)):
+            if target is None:
+                self.__add_idle_unit(unit)
+            else:
+                self.call_task(unit, Attack(target))
+
+    def __add_idle_unit(self, unit):
+        if unit.damage is not None and unit not in self.__idle_units:
+            self.__idle_units.add(unit)
+            self.__idle_queue.append((self.time + self.idle_scan_interval,
+                                      unit))
+
+    def __find_targets(self, units):
+
+        # Find the closest enemy in range of every unit with one batch
+        # query, which tests all candidates at once.
+        if not units:
+            return []
+        def enemy(i, other):
+            return other.color != units[i].color
+        points = [self.cell_to_point(unit.cell) for unit in units]
+        scan_ranges = [unit.max_range + max(unit.size) / 2.0
+                       for unit in units]
+        return self.__proximity_grid.nearest_many(points, scan_ranges, enemy)
 
     def __update_tasks(self):
-        while self.__task_queue and self.__task_queue[0][0] <= self.time:
-            task = heappop(self.__task_queue)[-1]
+        for task in self.task_queue.pop_due(self.time):
+            del self.__task_entries[task]
             unit = task.unit
             if (unit in self.units and unit.task_stack and
                 task is unit.task_stack[-1]):
@@ -92,6 +410,9 @@ class Game(object):
         rect = rect_from_center_and_size(point, unit.size)
         self.__proximity_grid[unit] = rect
         self.forces[unit.color].add_unit(unit)
+        self.__add_idle_unit(unit)
+        for listener in self.listeners:
+            listener.unit_added(unit)
 
     def stop_unit(self, unit):
         for task in unit.task_stack:
@@ -105,36 +426,122 @@ class Game(object):
             unit.task_queue.append(task)
 
     def call_task(self, unit, task):
+        if unit.task_stack:
+            self.__cancel_task(unit.task_stack[-1])
         unit.task_stack.append(task)
         task.init(self, unit)
         self.schedule_task(task)
 
     def schedule_task(self, task, delay=0):
-        heappush(self.__task_queue, (self.time + delay, task))
+
+        # A task is only updated at the last time it was scheduled for, so
+        # any earlier entry is cancelled.
+        self.__cancel_task(task)
+        entry = self.task_queue.push(self.time + delay, task)
+        self.__task_entries[task] = entry
+        return entry
+
+    def unschedule_task(self, entry):
+        task = entry[1]
+        if self.__task_entries.get(task) is entry:
+            self.__cancel_task(task)
+
+    def __cancel_task(self, task):
+        entry = self.__task_entries.pop(task, None)
+        if entry is not None:
+            self.task_queue.cancel(entry)
 
     def remove_task(self, task):
         unit = task.unit
         assert unit.task_stack and unit.task_stack[-1] is task
         unit.task_stack.pop()
+        self.__cancel_task(task)
         if unit.task_stack:
             self.schedule_task(unit.task_stack[-1])
         elif unit.task_queue:
             self.call_task(unit, unit.task_queue.popleft())
+        else:
+            self.__add_idle_unit(unit)
 
     def remove_unit(self, unit):
+        self.__routes.pop(unit, None)
+        self.__idle_units.discard(unit)
+        for task in unit.task_stack:
+            self.__cancel_task(task)
         self.forces[unit.color].remove_unit(unit)
         del self.__proximity_grid[unit]
         unit.cell = None
         self.normalize_cell_locks(unit)
+        self.__cell_locks.release(unit)
         self.units.remove(unit)
+        for listener in self.listeners:
+            listener.unit_removed(unit)
 
     def request_path(self, unit, goal, set_path):
-        path_request = [unit, goal, set_path, False]
+        path_request = [unit, goal, set_path, self.time, False]
         self.__path_queue.append(path_request)
+        self.path_stats.backlog += 1
         return path_request
 
+    def create_planner(self, unit, goal):
+
+        # Like path searches, planners walk through moving units, except
+        # near the unit, where cells are looked at again on every replan.
+        # Lock changes bump the region versions, so that cells that were
+        # blocked by units that have since walked away are looked at again.
+        radius = REPLAN_RADIUS * self.__grid.cell_size
+        def passable(cell):
+            with_moving = self.__grid.cell_dist(unit.cell, cell) > radius
+            return self.lockable_cell(unit, cell, with_moving)
+        return DStarLite(self.__grid, unit.cell, goal, passable, REPLAN_LIMIT,
+                         self.__lock_versions)
+
+    def flow_field(self, goal, large, cell):
+
+        # Flow fields only see units that cannot move, just like the cluster
+        # maps, so that they stay valid while units walk through them. If
+        # the goal is taken by such a unit, such as a building, the field
+        # is built through it and ends where units reach it.
+        key = goal, large
+        entry = self.__flow_fields.pop(key, None)
+        if entry is None or not self.__static_versions.current(entry[0]):
+            cell_locks = self.__cell_locks
+            def free(cell):
+                return cell_locks.free(cell, large)
+            owner = cell_locks.owner(goal)
+            if owner is None or owner.speed is not None:
+                field = FlowField(self.__grid, goal, free)
+            else:
+                def passable(cell):
+                    if free(cell):
+                        return True
+                    cells = [cell]
+                    if large:
+                        cells.extend(self.__grid.neighbors(cell))
+                    for cell in cells:
+                        other = cell_locks.owner(cell)
+                        if (cell not in cell_locks
+                            or other is not None and other is not owner
+                            and other.speed is None):
+                            return False
+                    return True
+                def blocked(cell):
+                    return not free(cell)
+                field = FlowField(self.__grid, goal, passable,
+                                  blocked=blocked)
+            entry = None, field
+        field = entry[1]
+        if field.extend(cell) or entry[0] is None:
+            entry = self.__static_versions.stamp(field.cells()), field
+        self.__flow_fields[key] = entry
+        while len(self.__flow_fields) > FLOW_FIELD_CACHE_SIZE:
+            self.__flow_fields.popitem(last=False)
+        return entry[1]
+
     def remove_path_request(self, path_request):
-        path_request[-1] = True
+        if not path_request[-1]:
+            path_request[-1] = True
+            self.path_stats.backlog -= 1
 
     def damage_factor(self, attacker, defender):
         return damage_factors.get((type(attacker), type(defender)), 1.0)
@@ -144,44 +551,57 @@ class Game(object):
             return self.lockable_cell(unit, cell)
         def neighbors(cell):
             cells = list(self.__grid.neighbors(cell))
-            random.shuffle(cells)
+            self.random.shuffle(cells)
             return cells
         path = shortest_path(start, goal, neighbors,
                              self.__grid.neighbor_dist)
         return path[-1] if path else start
 
     def add_cell_locks(self, unit, dest):
+        old_locks = frozenset(unit.cell_locks)
         unit.cell_locks.add(dest)
         if unit.large:
             unit.cell_locks.update(self.__grid.neighbors(dest))
-        for cell in unit.cell_locks:
-            self.__cell_locks[cell] = unit
+        self.__cell_locks.lock(unit, unit.cell_locks)
+        self.__bump_versions(unit, unit.cell_locks - old_locks)
 
     def normalize_cell_locks(self, unit):
+        old_locks = frozenset(unit.cell_locks)
         if unit.cell_locks:
-            for cell in unit.cell_locks:
-                del self.__cell_locks[cell]
+            self.__cell_locks.unlock(unit.cell_locks)
             unit.cell_locks.clear()
         if unit.cell is not None:
             unit.cell_locks.add(unit.cell)
             if unit.large:
                 unit.cell_locks.update(self.__grid.neighbors(unit.cell))
-        for cell in unit.cell_locks:
-            self.__cell_locks[cell] = unit
+        self.__cell_locks.lock(unit, unit.cell_locks)
+        self.__bump_versions(unit, unit.cell_locks ^ old_locks)
+
+    def __bump_versions(self, unit, cells):
+
+        # The cluster maps only see units that cannot move, and leave other
+        # units to the refinement, so their regions rarely change.
+        self.__lock_versions.bump(cells)
+        if unit.speed is None:
+            self.__static_versions.bump(cells)
             
     def lockable_cell(self, unit, cell, with_moving=False):
-        def lockable(cell):
-            return (self.__cell_locks.get(cell) in (unit, None)
-                    or with_moving and self.__cell_locks[cell].moving)
-        return (lockable(cell)
-                and (not unit.large
-                     or all(lockable(n) for n in self.__grid.neighbors(cell))))
+        return self.__cell_locks.lockable(unit, cell, with_moving)
+
+    def set_moving(self, unit, moving):
+        unit.moving = moving
+        self.__cell_locks.set_moving(unit, moving)
 
     def move_unit(self, unit, cell):
         unit.cell = cell
         point = self.cell_to_point(cell)
         rect = rect_from_center_and_size(point, unit.size)
         self.__proximity_grid[unit] = rect
+        for listener in self.listeners:
+            listener.unit_moved(unit)
+
+    def units_in_rect(self, rect):
+        return self.__proximity_grid.intersect(rect)
 
     def cell_to_point(self, cell):
         return self.__grid.cell_to_point(cell)
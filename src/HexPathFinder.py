@@ -0,0 +1,195 @@
+# Copyright (c) 2008 Mikael Lind
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+from array import array
+from heapq import heappop, heappush
+
+
+class HexPathFinder(object):
+
+    """A* search specialized for hex grids with unit step costs.
+
+    Cells are packed into integers relative to a square window centered on
+    the start of each search, and the search state is kept in arrays that are
+    reused between searches. A generation counter tells which entries belong
+    to the current search, so the arrays never need to be cleared.
+    """
+
+    def __init__(self, radius):
+
+        """Initialize the path finder for searches of the given radius."""
+
+        self.__radius = radius
+        self.__width = width = 2 * radius + 1
+        size = width * width
+        self.__g = array('i', [0]) * size
+        self.__h = array('i', [0]) * size
+        self.__parent = array('i', [0]) * size
+        self.__generation = array('i', [0]) * size
+        self.__closed = array('i', [0]) * size
+        self.__current = 0
+        self.__offsets = ((-width, -1, 0), (-width + 1, -1, 1), (-1, 0, -1),
+                          (1, 0, 1), (width - 1, 1, -1), (width, 1, 0))
+        self.__visited = []
+        self.__blocked = []
+        self.__origin = None
+
+    def radius(self):
+
+        """Return the search radius."""
+
+        return self.__radius
+
+    def nodes(self):
+
+        """Return the number of nodes seen by the last search."""
+
+        return len(self.__visited)
+
+    def cells(self):
+
+        """Return the cells seen by the last search."""
+
+        return [self.__unpack(index) for index in self.__visited]
+
+    def blocked_cells(self):
+
+        """Return the cells found impassable by the last search."""
+
+        return [self.__unpack(index) for index in self.__blocked]
+
+    def find_path(self, start, goal, passable, limit=None):
+
+        """Find the shortest path from start to goal.
+
+        Arguments:
+
+          start          - The starting cell.
+          goal           - The goal cell.
+          passable(cell) - A function returning true if a cell can be
+                           entered, false otherwise.
+          limit          - The maximum number of cells to search. Searches
+                           never leave the window, whatever the limit.
+
+        The function returns the best path found, leading to the goal or as
+        close to it as possible. The returned path excludes the starting cell.
+        """
+
+        radius = self.__radius
+        width = self.__width
+        offsets = self.__offsets
+        g_costs = self.__g
+        h_costs = self.__h
+        parents = self.__parent
+        generations = self.__generation
+        closed = self.__closed
+        if limit is None:
+            limit = width * width
+
+        self.__current += 1
+        generation = self.__current
+        self.__origin = start
+        start_m, start_n = start
+        goal_m, goal_n = goal
+        dm, dn = goal_m - start_m, goal_n - start_n
+        if max(abs(dm), abs(dn)) <= radius:
+            goal_index = (dm + radius) * width + dn + radius
+        else:
+            goal_index = -1
+
+        start_index = radius * width + radius
+        start_h = (abs(dm) + abs(dn) + abs(dm + dn)) >> 1
+        g_costs[start_index] = 0
+        h_costs[start_index] = start_h
+        parents[start_index] = -1
+        generations[start_index] = generation
+        closed[start_index] = 0
+        visited = self.__visited = [start_index]
+        blocked = self.__blocked = []
+        seen = 1
+        heap = [(start_h, start_h, 0, start_index)]
+        best_index, best_h = start_index, start_h
+        count = 1
+
+        while heap:
+            f, h, num, index = heappop(heap)
+            if closed[index] == generation:
+                continue
+            closed[index] = generation
+            if index == goal_index:
+                best_index = index
+                break
+
+            row, col = divmod(index, width)
+            if row == 0 or col == 0 or row == width - 1 or col == width - 1:
+                continue
+            m = start_m + row - radius
+            n = start_n + col - radius
+            neighbor_g = g_costs[index] + 1
+            for offset, offset_m, offset_n in offsets:
+                neighbor = index + offset
+                if generations[neighbor] == generation:
+                    # Unit costs and a consistent heuristic mean that closed
+                    # nodes are never improved upon.
+                    if (closed[neighbor] != generation
+                        and neighbor_g < g_costs[neighbor]):
+                        g_costs[neighbor] = neighbor_g
+                        parents[neighbor] = index
+                        h = h_costs[neighbor]
+                        count += 1
+                        heappush(heap, (neighbor_g + h, h, count, neighbor))
+                    continue
+                if seen >= limit:
+                    continue
+                neighbor_m = m + offset_m
+                neighbor_n = n + offset_n
+                generations[neighbor] = generation
+                if not passable((neighbor_m, neighbor_n)):
+                    closed[neighbor] = generation
+                    blocked.append(neighbor)
+                    continue
+                dm = goal_m - neighbor_m
+                dn = goal_n - neighbor_n
+                h = (abs(dm) + abs(dn) + abs(dm + dn)) >> 1
+                closed[neighbor] = 0
+                g_costs[neighbor] = neighbor_g
+                h_costs[neighbor] = h
+                parents[neighbor] = index
+                visited.append(neighbor)
+                seen += 1
+                count += 1
+                heappush(heap, (neighbor_g + h, h, count, neighbor))
+                if h < best_h:
+                    best_index, best_h = neighbor, h
+
+        path = []
+        index = best_index
+        while index != start_index:
+            path.append(self.__unpack(index))
+            index = parents[index]
+        path.reverse()
+        return path
+
+    def __unpack(self, index):
+        row, col = divmod(index, self.__width)
+        start_m, start_n = self.__origin
+        return start_m + row - self.__radius, start_n + col - self.__radius
@@ -0,0 +1,180 @@
+# Copyright (c) 2008 Mikael Lind
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+from __future__ import division
+
+
+MINIMAP_CELL_SIZE = 3
+MINIMAP_MARGIN = 10.0
+
+
+class Minimap(object):
+
+    """Mapping of the game map onto a minimap, with an occupancy grid.
+
+    The grid counts the units of every force in cells of the minimap,
+    and is updated when the game adds, moves or removes a unit. The map
+    covers the bounds of the game, or, if it has none, the units with a
+    margin. It is extended whenever a unit moves outside of it, which
+    increases the version.
+    """
+
+    def __init__(self, game, size, cell_size=MINIMAP_CELL_SIZE,
+                 margin=MINIMAP_MARGIN):
+
+        """Cover the units of a game and listen for changes to them.
+
+        Arguments:
+
+          game      - The game.
+          size      - The width and height of the minimap in pixels.
+          cell_size - The size of the grid cells in pixels.
+          margin    - The margin around the units of a game without bounds,
+                      in meters.
+        """
+
+        self.game = game
+        self.__size = size
+        self.__cell_size = cell_size
+        self.__margin = margin
+        self.__counts = {}
+        self.__unit_keys = {}
+        self.version = 0
+        self.changed = True
+        if game.bounds is not None:
+            (min_m, min_n), (max_m, max_n) = game.bounds
+            points = [game.cell_to_point(cell)
+                      for cell in ((min_m, min_n), (min_m, max_n),
+                                   (max_m, min_n), (max_m, max_n))]
+            self.__set_extent(points, 0.0)
+        else:
+            points = [game.cell_to_point(unit.cell) for unit in game.units]
+            self.__set_extent(points or [(0.0, 0.0)], margin)
+        for unit in game.units:
+            self.unit_added(unit)
+        game.listeners.append(self)
+
+    def close(self):
+
+        """Stop listening to the game."""
+
+        self.game.listeners.remove(self)
+
+    def extent(self):
+
+        """Return the bounding box of the map in meters."""
+
+        return self.__extent
+
+    def to_minimap(self, point):
+
+        """Convert a point on the map to minimap pixels."""
+
+        x, y = point
+        return (self.__offset_x + (x - self.__min_x) * self.__scale,
+                self.__offset_y + (self.__max_y - y) * self.__scale)
+
+    def to_world(self, pos):
+
+        """Convert minimap pixels to a point on the map."""
+
+        x, y = pos
+        return (self.__min_x + (x - self.__offset_x) / self.__scale,
+                self.__max_y - (y - self.__offset_y) / self.__scale)
+
+    def cell_size(self):
+
+        """Return the size of the grid cells in pixels."""
+
+        return self.__cell_size
+
+    def occupied_cells(self):
+
+        """Return a dictionary from force colors to occupied grid cells."""
+
+        cells = {}
+        for color, i, j in self.__counts:
+            cells.setdefault(color, []).append((i, j))
+        return cells
+
+    def unit_added(self, unit):
+        x, y = point = self.game.cell_to_point(unit.cell)
+        (min_x, min_y), (max_x, max_y) = self.__extent
+        if not (min_x <= x <= max_x and min_y <= y <= max_y):
+            self.__set_extent([point, (min_x, min_y), (max_x, max_y)],
+                              self.__margin)
+            self.__rebuild()
+        self.__move(unit, self.__key(unit, point))
+
+    unit_moved = unit_added
+
+    def unit_removed(self, unit):
+        self.__move(unit, None)
+
+    def __key(self, unit, point):
+        x, y = self.to_minimap(point)
+        return (unit.color, int(x // self.__cell_size),
+                int(y // self.__cell_size))
+
+    def __move(self, unit, key):
+        old_key = self.__unit_keys.pop(unit, None)
+        if old_key == key:
+            if key is not None:
+                self.__unit_keys[unit] = key
+            return
+        if old_key is not None:
+            count = self.__counts[old_key] - 1
+            if count:
+                self.__counts[old_key] = count
+            else:
+                del self.__counts[old_key]
+                self.changed = True
+        if key is not None:
+            self.__unit_keys[unit] = key
+            count = self.__counts.get(key, 0)
+            self.__counts[key] = count + 1
+            if not count:
+                self.changed = True
+
+    def __rebuild(self):
+        self.__counts.clear()
+        units = list(self.__unit_keys)
+        self.__unit_keys.clear()
+        for unit in units:
+            point = self.game.cell_to_point(unit.cell)
+            self.__move(unit, self.__key(unit, point))
+
+    def __set_extent(self, points, margin):
+
+        # Scale the map uniformly to fit the minimap, centered.
+        xs, ys = zip(*points)
+        min_x, min_y = min(xs) - margin, min(ys) - margin
+        max_x, max_y = max(xs) + margin, max(ys) + margin
+        self.__extent = (min_x, min_y), (max_x, max_y)
+        width, height = self.__size
+        self.__scale = min(width / max(max_x - min_x, 1.0),
+                           height / max(max_y - min_y, 1.0))
+        self.__min_x, self.__max_y = min_x, max_y
+        self.__offset_x = (width - (max_x - min_x) * self.__scale) / 2
+        self.__offset_y = (height - (max_y - min_y) * self.__scale) / 2
+        self.version += 1
+        self.changed = True
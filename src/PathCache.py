@@ -0,0 +1,163 @@
+# Copyright (c) 2008 Mikael Lind
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+from collections import OrderedDict
+
+
+REGION_SIZE = 8
+PATH_CACHE_CAPACITY = 1024
+
+
+class RegionVersions(object):
+
+    """Version counters for square regions of cells."""
+
+    def __init__(self, region_size=REGION_SIZE):
+
+        """Initialize the counters."""
+
+        self.__region_size = region_size
+        self.__versions = {}
+
+    def region_size(self):
+
+        """Return the region size in cells."""
+
+        return self.__region_size
+
+    def region(self, cell):
+
+        """Return the region containing the given cell."""
+
+        m, n = cell
+        return m // self.__region_size, n // self.__region_size
+
+    def bump(self, cells):
+
+        """Bump the version of every region containing one of the cells."""
+
+        for region in set(self.region(cell) for cell in cells):
+            self.__versions[region] = self.__versions.get(region, 0) + 1
+
+    def stamp(self, cells):
+
+        """Return the current versions of the regions covering the cells."""
+
+        return tuple((region, self.__versions.get(region, 0))
+                     for region in set(self.region(cell) for cell in cells))
+
+    def stamp_regions(self, regions):
+
+        """Return the current versions of the given regions."""
+
+        return tuple((region, self.__versions.get(region, 0))
+                     for region in regions)
+
+    def current(self, stamp):
+
+        """Test whether no region in the given stamp has changed since."""
+
+        return all(self.__versions.get(region, 0) == version
+                   for region, version in stamp)
+
+
+class PathCache(object):
+
+    """Least recently used cache of paths keyed by start, goal and footprint.
+
+    Each entry is stamped with the region versions of the cells that were
+    searched to find it, and is discarded on lookup if any of those regions
+    has changed since. The cells that the search found impassable are kept
+    with the entry, since they can become passable without a lock change,
+    such as when the unit locking them starts moving.
+    """
+
+    def __init__(self, versions, capacity=PATH_CACHE_CAPACITY):
+
+        """Initialize the cache."""
+
+        self.__versions = versions
+        self.__capacity = capacity
+        self.__entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def __len__(self):
+
+        """Return the number of entries."""
+
+        return len(self.__entries)
+
+    def get(self, start, goal, large, valid=None, passable=None):
+
+        """Return the cached path, or None if there is no current entry.
+
+        If given, valid(path) is called to check a cached path against state
+        that the region versions do not cover, and passable(cell) is called
+        to check that the cells that were found impassable still are.
+        """
+
+        entry = self.__entries.pop((start, goal, large), None)
+        if entry is None:
+            self.misses += 1
+            return None
+        path, stamp, blocked = entry
+        if (not self.__versions.current(stamp)
+            or valid is not None and not valid(path)
+            or passable is not None
+            and any(passable(cell) for cell in blocked)):
+            self.invalidations += 1
+            self.misses += 1
+            return None
+        self.__entries[start, goal, large] = entry
+        self.hits += 1
+        return path
+
+    def put(self, start, goal, large, path, cells, blocked=()):
+
+        """Cache a path that was found by searching the given cells.
+
+        The blocked cells are those that the search found impassable. They
+        should also be among the searched cells.
+        """
+
+        self.__entries.pop((start, goal, large), None)
+        self.__entries[start, goal, large] = (tuple(path),
+                                              self.__versions.stamp(cells),
+                                              tuple(blocked))
+        while len(self.__entries) > self.__capacity:
+            self.__entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+
+        """Remove all entries."""
+
+        self.__entries.clear()
+
+    def hit_ratio(self):
+
+        """Return the fraction of lookups that were hits."""
+
+        lookups = self.hits + self.misses
+        return self.hits / float(lookups) if lookups else 0.0
@@ -0,0 +1,99 @@
+# Copyright (c) 2008 Mikael Lind
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+from geometry import rect_contains_point
+from ProximityGrid import ProximityGrid
+
+
+PICKING_CELL_SIZE = 64
+
+
+class PickingIndex(object):
+
+    """Index of the sprite rectangles of units for picking with the mouse.
+
+    The rectangles are in screen coordinates before scrolling, and are
+    updated when the game adds, moves or removes a unit.
+    """
+
+    def __init__(self, game, sprite_rect, cell_size=PICKING_CELL_SIZE):
+
+        """Index the units of a game and listen for changes to them.
+
+        Arguments:
+
+          game              - The game.
+          sprite_rect(unit) - A function returning the rectangle of the
+                              sprite of a unit.
+          cell_size         - The cell size of the grid.
+        """
+
+        self.game = game
+        self.__sprite_rect = sprite_rect
+        self.__grid = ProximityGrid(cell_size)
+        for unit in game.units:
+            self.unit_added(unit)
+        game.listeners.append(self)
+
+    def __len__(self):
+
+        """Return the number of indexed units."""
+
+        return len(self.__grid)
+
+    def close(self):
+
+        """Stop listening to the game."""
+
+        self.game.listeners.remove(self)
+
+    def unit_added(self, unit):
+        self.__grid[unit] = self.__sprite_rect(unit)
+
+    unit_moved = unit_added
+
+    def unit_removed(self, unit):
+        del self.__grid[unit]
+
+    def pick(self, point):
+
+        """Return the top-most unit with a sprite containing the point.
+
+        Of overlapping sprites, the unit lowest on the map is on top. Return
+        None if there is no such unit.
+        """
+
+        x, y = point
+        candidates = self.__grid.intersect(((x, y), (x + 1, y + 1)))
+        hits = [unit for unit in candidates
+                if rect_contains_point(self.__grid[unit], point)]
+        if not hits:
+            return None
+        def map_y(unit):
+            return self.game.cell_to_point(unit.cell)[1]
+        return min(hits, key=map_y)
+
+    def select(self, rect):
+
+        """Return the set of units with sprites intersecting a rectangle."""
+
+        return self.__grid.intersect(rect)
@@ -19,8 +19,15 @@
 # SOFTWARE.
 
 
+from array import array
+from heapq import heappush, heapreplace
 from itertools import chain
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 def intersects(a, b):
 
@@ -38,17 +45,51 @@ def intersects(a, b):
             and a_bottom < b_top and b_bottom < a_top)
 
 
+def box_dist(bounds, point):
+
+    """Return the distance from a point to a bounding box.
+
+    The distance is zero if the point is inside the bounding box.
+    """
+
+    (min_x, min_y), (max_x, max_y) = bounds
+    x, y = point
+    dx = max(min_x - x, 0, x - max_x)
+    dy = max(min_y - y, 0, y - max_y)
+    return (dx * dx + dy * dy) ** 0.5
+
+
 class ProximityGrid(object):
 
-    """Sparse planar grid for fast proximity searches."""
+    """Planar grid for fast proximity searches.
+
+    The grid is sparse by default. If bounds are given, the cells covering
+    them are allocated up front and entries outside of the bounds are
+    clamped to the border cells. The bounding boxes of all entries are also
+    kept in a contiguous coordinate array for batch queries.
+    """
     
-    def __init__(self, cell_size=1):
+    def __init__(self, cell_size=1, bounds=None):
 
         """Initialize the grid."""
 
         self.__cell_size = cell_size
-        self.__cells = {}
+        self.__bounds = bounds
+        if bounds is None:
+            self.__cells = {}
+            self.__extent = None
+        else:
+            (min_x, min_y), (max_x, max_y) = bounds
+            self.__min_x = self.__hash(min_x)
+            self.__min_y = self.__hash(min_y)
+            self.__width = self.__hash(max_x) - self.__min_x + 1
+            self.__height = self.__hash(max_y) - self.__min_y + 1
+            self.__cells = [set() for i in xrange(self.__width
+                                                  * self.__height)]
         self.__entries = {}
+        self.__coords = array('d')
+        self.__keys = []
+        self.__free_slots = []
 
     def __getitem__(self, key):
 
@@ -66,12 +107,40 @@ class ProximityGrid(object):
         else:
             self.__update(key, bounds, entry)
 
+    def update(self, items):
+
+        """Insert or update entries for the given (key, bounds) pairs.
+
+        New entries are added to the coordinate array in one go, which is
+        faster than inserting them one at a time.
+        """
+
+        entries, keys = self.__entries, self.__keys
+        coords = array('d')
+        for key, bounds in items:
+            if key in entries or self.__free_slots:
+                # Existing and reused slots are written in place, so the
+                # pending coordinates must be in the array first.
+                self.__coords.extend(coords)
+                del coords[:]
+                self[key] = bounds
+                continue
+            indices = frozenset(self.__indices(bounds))
+            self.__add_to_cells(key, indices)
+            entries[key] = _GridEntry(bounds, indices, len(keys))
+            keys.append(key)
+            (min_x, min_y), (max_x, max_y) = bounds
+            coords.extend((min_x, min_y, max_x, max_y))
+        self.__coords.extend(coords)
+
     def __delitem__(self, key):
 
         """Delete the entry for the given key."""
 
         entry = self.__entries.pop(key)
         self.__remove_from_cells(key, entry.indices)
+        self.__keys[entry.slot] = None
+        self.__free_slots.append(entry.slot)
 
     def __contains__(self, key):
 
@@ -91,46 +160,296 @@ class ProximityGrid(object):
 
         return self.__cell_size
 
+    def bounds(self):
+
+        """Return the bounds of a dense grid, or None if the grid is sparse."""
+
+        return self.__bounds
+
     def intersect(self, bounds):
 
         """Return keys for entries that intersect the given bounding box."""
 
-        cells = (self.__cells.get(p, ()) for p in self.__indices(bounds))
+        cells = (self.__cell_keys(p) for p in self.__indices(bounds))
         return set(key for key in chain(*cells)
                    if intersects(self[key], bounds))
 
+    def intersect_many(self, rects):
+
+        """Find the entries that intersect each of the given bounding boxes.
+
+        Return a list of (index, key) pairs, where index is the position of
+        the bounding box in rects. The candidates from the grid cells are
+        tested for overlap all at once, using NumPy if it is available.
+        """
+
+        # The indices are C ints, which NumPy reads as intc whatever the
+        # size of a long on the platform.
+        queries = array('i')
+        slots = array('i')
+        query_coords = array('d')
+        for i, bounds in enumerate(rects):
+            (min_x, min_y), (max_x, max_y) = bounds
+            query_coords.extend((min_x, min_y, max_x, max_y))
+            candidates = set(chain(*(self.__cell_keys(p)
+                                     for p in self.__indices(bounds))))
+            for key in candidates:
+                queries.append(i)
+                slots.append(self.__entries[key].slot)
+        if not queries:
+            return []
+        keys = self.__keys
+        if numpy is not None:
+            query_index = numpy.frombuffer(queries, dtype=numpy.intc)
+            slot_index = numpy.frombuffer(slots, dtype=numpy.intc)
+            a = numpy.frombuffer(query_coords).reshape(-1, 4)[query_index]
+            b = numpy.frombuffer(self.__coords).reshape(-1, 4)[slot_index]
+            mask = ((a[:, 0] < b[:, 2]) & (b[:, 0] < a[:, 2])
+                    & (a[:, 1] < b[:, 3]) & (b[:, 1] < a[:, 3]))
+            return [(queries[j], keys[slots[j]])
+                    for j in numpy.flatnonzero(mask)]
+        a, b = query_coords, self.__coords
+        result = []
+        for i, slot in zip(queries, slots):
+            q, e = 4 * i, 4 * slot
+            if (a[q] < b[e + 2] and b[e] < a[q + 2]
+                and a[q + 1] < b[e + 3] and b[e + 1] < a[q + 3]):
+                result.append((i, keys[slot]))
+        return result
+
+    def nearest(self, point, k=1, filter=None, max_dist=None):
+
+        """Return keys for the k entries closest to the given point.
+
+        The keys are sorted by the distance from the point to their bounding
+        boxes, and entries at the same distance by their bounding boxes, so
+        that the result does not depend on the iteration order of the keys
+        or the order of insertion. If given, only keys for which filter(key)
+        is true and entries within max_dist of the point are considered.
+        """
+
+        if k <= 0:
+            return []
+
+        # Keep the best k entries found so far in a heap, with the worst
+        # one at the top, and stop when no later ring can beat it.
+        best = []
+        for bound, keys in self.__rings(point):
+            for key in keys:
+                if filter is None or filter(key):
+                    entry = self.__entries[key]
+                    dist = box_dist(entry.bounds, point)
+                    if max_dist is not None and dist > max_dist:
+                        continue
+                    (min_x, min_y), (max_x, max_y) = entry.bounds
+                    item = (-dist, -min_x, -min_y, -max_x, -max_y,
+                            -entry.slot, key)
+                    if len(best) < k:
+                        heappush(best, item)
+                    elif item > best[0]:
+                        heapreplace(best, item)
+            if len(best) == k and -best[0][0] <= bound:
+                break
+            if max_dist is not None and bound >= max_dist:
+                break
+        best.sort(reverse=True)
+        return [item[-1] for item in best]
+
+    def nearest_many(self, points, max_dists, filter=None):
+
+        """Return the key for the closest entry to each of the given points.
+
+        This is nearest with k set to 1 for many points at once, where the
+        candidates for all points are found with a single intersect_many
+        call. Only entries within the max_dist of each point, and keys for
+        which filter(index, key) is true, are considered. The key is None
+        for points without such entries.
+        """
+
+        # Rectangles only intersect entries that overlap them, so they are
+        # padded by a sliver of a cell to include entries at exactly the
+        # maximum distance.
+        rects = []
+        for (x, y), max_dist in zip(points, max_dists):
+            size = max_dist + 0.001 * self.__cell_size
+            rects.append(((x - size, y - size), (x + size, y + size)))
+        best = [None] * len(rects)
+        for i, key in self.intersect_many(rects):
+            if filter is not None and not filter(i, key):
+                continue
+            entry = self.__entries[key]
+            dist = box_dist(entry.bounds, points[i])
+            if dist > max_dists[i]:
+                continue
+            (min_x, min_y), (max_x, max_y) = entry.bounds
+            item = dist, min_x, min_y, max_x, max_y, entry.slot, key
+            if best[i] is None or item < best[i]:
+                best[i] = item
+        return [item and item[-1] for item in best]
+
+    def within_radius(self, point, radius, filter=None):
+
+        """Return keys for entries within the radius of the given point.
+
+        If given, only keys for which filter(key) is true are returned.
+        """
+
+        result = set()
+        for bound, keys in self.__rings(point):
+            for key in keys:
+                if ((filter is None or filter(key))
+                    and box_dist(self.__entries[key].bounds,
+                                 point) <= radius):
+                    result.add(key)
+            if bound >= radius:
+                break
+        return result
+
+    def __rings(self, point):
+
+        # Walk the cells in square rings of growing radius around the point,
+        # and yield the keys that were not seen before in every ring,
+        # together with a lower bound on the distance to every later key.
+        # The walk stops at the extent of the cells that have been used.
+        x, y = point
+        center_x, center_y = self.__hash(x), self.__hash(y)
+        if self.__bounds is None:
+            if self.__extent is None:
+                return
+            min_x, min_y, max_x, max_y = self.__extent
+            get = self.__cells.get
+            def cell_keys(i, j):
+                return get((i, j), ())
+            outside = False
+        else:
+            center_x -= self.__min_x
+            center_y -= self.__min_y
+            min_x, min_y = 0, 0
+            max_x, max_y = self.__width - 1, self.__height - 1
+            cells, height = self.__cells, self.__height
+            def cell_keys(i, j):
+                return cells[i * height + j]
+
+            # Entries outside of the bounds are clamped to the border cells,
+            # so there is no lower bound for points outside of the bounds.
+            outside = not (min_x <= center_x <= max_x
+                           and min_y <= center_y <= max_y)
+
+        seen = set()
+        max_r = max(center_x - min_x, max_x - center_x,
+                    center_y - min_y, max_y - center_y)
+        for r in xrange(max_r + 1):
+            indices = []
+            if r == 0:
+                if (min_x <= center_x <= max_x
+                    and min_y <= center_y <= max_y):
+                    indices.append((center_x, center_y))
+            else:
+                xs = xrange(max(center_x - r, min_x),
+                            min(center_x + r, max_x) + 1)
+                for j in (center_y - r, center_y + r):
+                    if min_y <= j <= max_y:
+                        indices.extend((i, j) for i in xs)
+                ys = xrange(max(center_y - r + 1, min_y),
+                            min(center_y + r - 1, max_y) + 1)
+                for i in (center_x - r, center_x + r):
+                    if min_x <= i <= max_x:
+                        indices.extend((i, j) for j in ys)
+            keys = []
+            for i, j in indices:
+                for key in cell_keys(i, j):
+                    if key not in seen:
+                        seen.add(key)
+                        keys.append(key)
+            yield (0 if outside else r * self.__cell_size), keys
+            if len(seen) == len(self.__entries):
+                return
+
+    def __hash(self, value):
+        return int(value / self.__cell_size)
+
     def __indices(self, bounds):
         min_p, max_p = bounds
         min_x, min_y = min_p
         max_x, max_y = max_p
-
-        def hash(value):
-            return int(value / self.__cell_size)
-
-        return ((x, y) for x in xrange(hash(min_x), hash(max_x) + 1)
-                for y in xrange(hash(min_y), hash(max_y) + 1))
+        hash = self.__hash
+
+        if self.__bounds is None:
+            return ((x, y) for x in xrange(hash(min_x), hash(max_x) + 1)
+                    for y in xrange(hash(min_y), hash(max_y) + 1))
+
+        # Clamp to the border cells of a dense grid and use flat indices.
+        width, height = self.__width, self.__height
+        offset_x, offset_y = self.__min_x, self.__min_y
+        min_i = min(max(hash(min_x) - offset_x, 0), width - 1)
+        max_i = min(max(hash(max_x) - offset_x, 0), width - 1)
+        min_j = min(max(hash(min_y) - offset_y, 0), height - 1)
+        max_j = min(max(hash(max_y) - offset_y, 0), height - 1)
+        return (i * height + j for i in xrange(min_i, max_i + 1)
+                for j in xrange(min_j, max_j + 1))
+
+    def __cell_keys(self, p):
+        if self.__bounds is None:
+            return self.__cells.get(p, ())
+        else:
+            return self.__cells[p]
 
     def __insert(self, key, bounds):
         indices = frozenset(self.__indices(bounds))
         self.__add_to_cells(key, indices)
-        self.__entries[key] = _GridEntry(bounds, indices)
+        if self.__free_slots:
+            slot = self.__free_slots.pop()
+            self.__keys[slot] = key
+        else:
+            slot = len(self.__keys)
+            self.__keys.append(key)
+            self.__coords.extend((0.0, 0.0, 0.0, 0.0))
+        self.__set_coords(slot, bounds)
+        self.__entries[key] = _GridEntry(bounds, indices, slot)
 
     def __update(self, key, bounds, entry):
         entry.bounds = bounds
+        self.__set_coords(entry.slot, bounds)
         indices = frozenset(self.__indices(bounds))
         if indices != entry.indices:
             self.__remove_from_cells(key, entry.indices - indices)
             self.__add_to_cells(key, indices - entry.indices)
             entry.indices = indices
 
+    def __set_coords(self, slot, bounds):
+        (min_x, min_y), (max_x, max_y) = bounds
+        self.__coords[4 * slot:4 * slot + 4] = array('d', (min_x, min_y,
+                                                           max_x, max_y))
+
     def __add_to_cells(self, key, indices):
+        if self.__bounds is not None:
+            for p in indices:
+                self.__cells[p].add(key)
+            return
         for p in indices:
             cells = self.__cells.get(p)
             if cells is None:
                 cells = self.__cells[p] = set()
+                self.__grow_extent(p)
             cells.add(key)
 
+    def __grow_extent(self, p):
+
+        # The extent covers every cell that has ever been used. It is not
+        # shrunk when cells are emptied, which only makes walks longer.
+        x, y = p
+        if self.__extent is None:
+            self.__extent = x, y, x, y
+        else:
+            min_x, min_y, max_x, max_y = self.__extent
+            self.__extent = (min(min_x, x), min(min_y, y),
+                             max(max_x, x), max(max_y, y))
+
     def __remove_from_cells(self, key, indices):
+        if self.__bounds is not None:
+            for p in indices:
+                self.__cells[p].remove(key)
+            return
         for p in indices:
             cells = self.__cells[p]
             cells.remove(key)
@@ -139,6 +458,7 @@ class ProximityGrid(object):
 
 
 class _GridEntry(object):
-    def __init__(self, bounds, indices):
+    def __init__(self, bounds, indices, slot):
         self.bounds = bounds
         self.indices = indices
+        self.slot = slot
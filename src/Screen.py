@@ -19,28 +19,105 @@
 # SOFTWARE.
 
 
-import pygame, sys, os, math
+from hashlib import md5
+import cPickle, pygame, sys, os, math, time
 from pygame.locals import *
 
+from Atlas import AtlasError, create_team_image, read_atlas
 from config.tasks import *
 from config.units import *
-from geometry import (manhattan_dist, normalize_rect, rect_contains_point,
-                      rect_from_center_and_size, rect_intersects_rect)
+from geometry import (manhattan_dist, normalize_rect,
+                      rect_from_center_and_size)
+from Minimap import Minimap
+from PickingIndex import PickingIndex
 from Vector import Vector
 
 
 BUILDINGS = (Tavern, Farm, Tower, ArcheryRange, Barracks, Stables, Temple)
 
+UNIT_CLASSES = tuple(Hero.__subclasses__() + list(BUILDINGS)
+                     + Minion.__subclasses__())
+TEAM_COLORS = dict(cyan=(0, 255, 255), green=(0, 255, 0), red=(255, 0, 0),
+                   yellow=(255, 255, 0))
+
+# Bump the version whenever the recoloring or the cache format changes.
+SPRITE_CACHE_VERSION = 1
+
+# The atlas is built from the unit images by build_atlas.py.
+ATLAS_FILE_NAME = 'atlas.dat'
+
+MINIMAP_FRAME_RATE = 10
+
+
+def find_root():
+    root = os.path.dirname(os.path.abspath(__file__))
+    while (root != '/'
+           and not os.path.isfile(os.path.join(root, 'siblings.root'))):
+        root = os.path.dirname(root)
+    return root
+
+
+def load_image(root, name):
+    file_name = os.path.join(root, 'data', name + '.png')
+    image = pygame.image.load(file_name).convert_alpha()
+    image.set_colorkey((0, 0, 255))
+    return image
+
+
+def create_unit_images(root, name, team_colors=TEAM_COLORS):
+
+    # Return the image and icon of a unit class, and the image in the color
+    # of every team, keyed by the team.
+    image = load_image(root, name)
+    images = dict(image=image, icon=load_image(root, name + 'Icon'))
+    for team, team_color in team_colors.iteritems():
+        images[team] = create_team_image(image, team_color)
+    return images
+
+
+def atlas_key(name, image_name):
+    return '%s:%s' % (name, image_name)
+
+
+def unit_images_key(root, name, team_colors=TEAM_COLORS):
+
+    # Return a key for the images of a unit class made by
+    # create_unit_images, from the cache version, the team colors and the
+    # names, modification times and sizes of the source images.
+    key = [SPRITE_CACHE_VERSION, sorted(team_colors.items())]
+    for file_name in (name, name + 'Icon'):
+        stat = os.stat(os.path.join(root, 'data', file_name + '.png'))
+        key.append((file_name, stat.st_mtime, stat.st_size))
+    return md5(repr(key)).hexdigest()
+
+
+def normalize_rect_size(old_pos, new_pos):
+    old_x, old_y = old_pos
+    new_x, new_y = new_pos
+    return pygame.Rect(min(old_x, new_x), min(old_y, new_y),
+                       abs(old_x - new_x), abs(old_y - new_y))
+
+
+def merge_rects(rects):
+
+    # Merge overlapping rectangles into their unions until none overlap.
+    merged = []
+    for rect in rects:
+        if not rect.width or not rect.height:
+            continue
+        i = rect.collidelist(merged)
+        while i != -1:
+            rect = rect.union(merged.pop(i))
+            i = rect.collidelist(merged)
+        merged.append(rect)
+    return merged
+
 
 class Screen(object):
 
     def __init__(self):
 
-        root = os.path.dirname(__file__)
-        while (root != '/'
-               and not os.path.isfile(os.path.join(root, 'siblings.root'))):
-            root = os.path.dirname(root)
-        self.root = root
+        self.root = find_root()
 
         pygame.mixer.pre_init(44100, -16, 2, 1024 * 3)
         pygame.init()
@@ -52,6 +129,19 @@ class Screen(object):
         self.selection = set()
         self.screen_x, self.screen_y = 0, 0
         self.mouse_button_down_pos = None
+        self.picking = None
+        self.minimap = None
+        self.minimap_background = None
+        self.minimap_image = None
+        self.next_minimap_time = 0.0
+
+        # What was painted in the last frame, for finding what changed.
+        self.drawn_units = {}
+        self.drawn_selection_rect = None
+        self.drawn_scroll = None
+        self.drawn_buttons = None
+        self.drawn_minimap_version = None
+        self.drawn_minimap_viewport = None
 
         self.window = pygame.display.set_mode((800, 600))
         pygame.display.set_caption('Siblings in Arms')
@@ -72,41 +162,89 @@ class Screen(object):
                          (0, 0), (800, 0))
 
         self.unit_images = {}
-        self.team_colors = dict(cyan=(0, 255, 255), green=(0, 255, 0),
-                                red=(255, 0, 0), yellow=(255, 255, 0))
+        self.team_colors = dict(TEAM_COLORS)
         self.team_images = {}
+        self.team_sprites = {}
         self.unit_icons = {}
 
         self.load_unit_images()
+        self.viewport_margin = self.sprite_margin()
         self.play_background_music()
 
     def load_image(self, name):
-        file_name = os.path.join(self.root, 'data', name + '.png')
-        image = pygame.image.load(file_name).convert_alpha()
-        image.set_colorkey((0, 0, 255))
-        return image
+        return load_image(self.root, name)
 
     def create_team_image(self, image, team_color, team_colorkey=(0, 255, 0)):
-        team_image = image.copy()
-        team_image.lock()
-        team_r, team_g, team_b = team_color
-        for x in xrange(image.get_width()):
-            for y in xrange(image.get_height()):
-                r, g, b, a = image.get_at((x, y))
-                if (r, g, b) == team_colorkey:
-                    team_image.set_at((x, y), (team_r, team_g, team_b, a))
-        team_image.unlock()
-        return team_image
+        return create_team_image(image, team_color, team_colorkey)
 
     def load_unit_images(self):
-        for cls in (Hero.__subclasses__() + list(BUILDINGS)
-                    + Minion.__subclasses__()):
+
+        # Use the atlas if it has been built and has every image, made
+        # from the current source images, and otherwise the separate
+        # images. The map panel blits the team images from sprites, which
+        # are a surface and an area of it.
+        try:
+            atlas = read_atlas(os.path.join(self.root, 'data',
+                                            ATLAS_FILE_NAME))
+        except (IOError, AtlasError):
+            atlas = None
+        image_names = ['image', 'icon'] + sorted(self.team_colors)
+        for cls in UNIT_CLASSES:
             name = cls.__name__
-            self.unit_images[cls] = image = self.load_image(name)
-            for team, team_color in self.team_colors.iteritems():
-                team_image = self.create_team_image(image, team_color)
-                self.team_images[team, cls] = team_image
-            self.unit_icons[cls] = self.load_image(name + 'Icon')
+            keys = [atlas_key(name, image_name) for image_name in image_names]
+            if (atlas is not None and all(key in atlas for key in keys)
+                and atlas.sources.get(name) == unit_images_key(
+                    self.root, name, self.team_colors)):
+                images = dict((image_name, atlas.image(key))
+                              for image_name, key in zip(image_names, keys))
+                sprites = dict((image_name, atlas.sprite(key))
+                               for image_name, key in zip(image_names, keys))
+            else:
+                images = self.load_cached_images(name)
+                sprites = dict((image_name, (image, image.get_rect()))
+                               for image_name, image in images.iteritems())
+            self.unit_images[cls] = images['image']
+            self.unit_icons[cls] = images['icon']
+            for team in self.team_colors:
+                self.team_images[team, cls] = images[team]
+                self.team_sprites[team, cls] = sprites[team]
+
+    def load_cached_images(self, name):
+
+        # The sprite, icon and team sprites of a unit class are cached
+        # together as raw pixels, keyed by their source images.
+        key = unit_images_key(self.root, name, self.team_colors)
+        cache_dir = os.path.join(self.root, 'cache', 'sprites')
+        cache_name = os.path.join(cache_dir, name + '.pickle')
+        try:
+            with open(cache_name, 'rb') as cache_file:
+                cache_key, pixels = cPickle.load(cache_file)
+            if cache_key == key:
+                images = {}
+                for image_name, (size, data) in pixels.iteritems():
+                    image = pygame.image.fromstring(data, size, 'RGBA')
+                    image = image.convert_alpha()
+                    image.set_colorkey((0, 0, 255))
+                    images[image_name] = image
+                return images
+        except (IOError, EOFError, ValueError, cPickle.UnpicklingError):
+            pass
+
+        images = create_unit_images(self.root, name, self.team_colors)
+        pixels = dict((image_name, (image.get_size(),
+                                    pygame.image.tostring(image, 'RGBA')))
+                      for image_name, image in images.iteritems())
+        try:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            temp_name = '%s.%d' % (cache_name, os.getpid())
+            with open(temp_name, 'wb') as cache_file:
+                cPickle.dump((key, pixels), cache_file,
+                             cPickle.HIGHEST_PROTOCOL)
+            os.rename(temp_name, cache_name)
+        except (IOError, OSError):
+            pass
+        return images
 
     def play_background_music(self):
         file_name = os.path.join(self.root, 'data', 'siblings1.ogg')
@@ -125,22 +263,44 @@ class Screen(object):
         return (float(x + self.screen_x) / self.PIXELS_PER_METER_X,
                 float(height - y - self.screen_y) / self.PIXELS_PER_METER_Y)
 
-    def interpolate_pos(self, game, unit):
+    def interpolate_pos(self, game, unit, alpha=0.0):
+
+        # The alpha is how far the display is into the next time step.
         if (unit.task_stack and type(unit.task_stack[-1]) is Step
             and unit.task_stack[-1].step_time):
             task = unit.task_stack[-1]
             origin = Vector(game.cell_to_point(task.origin))
             dest = Vector(game.cell_to_point(task.dest))
-            progress = (game.time - task.departure_time) / task.step_time
+            render_time = game.time + alpha * (game.time_step or 0.0)
+            progress = (render_time - task.departure_time) / task.step_time
             progress = max(0, min(progress, 1))
             return origin * (1 - progress) + dest * progress
         else:
             return game.cell_to_point(unit.cell)
 
-    def sorted_units(self, game):
+    def sprite_margin(self):
+
+        # A sprite can reach this far beyond the unit rectangle that the
+        # viewport is tested against, stepping at most a cell away from it.
+        width = max(image.get_width() for image in self.unit_images.values())
+        height = max(image.get_height()
+                     for image in self.unit_images.values())
+        return 1.0 + max(float(width) / self.PIXELS_PER_METER_X,
+                         float(height) / self.PIXELS_PER_METER_Y) / 2
+
+    def viewport_rect(self):
+        screen_size = self.map_panel.get_size()
+        width, height = screen_size
+        min_x, max_y = self.to_world_coords((0, 0), screen_size)
+        max_x, min_y = self.to_world_coords((width, height), screen_size)
+        margin = self.viewport_margin
+        return ((min_x - margin, min_y - margin),
+                (max_x + margin, max_y + margin))
+
+    def sorted_units(self, game, alpha=0.0):
         units = []
-        for unit in game.units:
-            unit_pos = self.interpolate_pos(game, unit)
+        for unit in game.units_in_rect(self.viewport_rect()):
+            unit_pos = self.interpolate_pos(game, unit, alpha)
             screen_pos = self.to_screen_coords(unit_pos,
                                                self.map_panel.get_size())
             screen_x, screen_y = screen_pos
@@ -153,10 +313,17 @@ class Screen(object):
         width, height = image.get_size()
         surface.blit(image, (x - width // 2, y - height // 2))
 
-    def update(self, game):
+    def update(self, game, alpha=0.0):
         self.selection &= game.units
         self.handle_events(game)
-        self.update_screen(game)
+        self.update_screen(game, alpha)
+
+    def show_lag(self, lag):
+        if lag > 0:
+            pygame.display.set_caption('Siblings in Arms (%d ms behind)'
+                                       % (lag * 1000))
+        else:
+            pygame.display.set_caption('Siblings in Arms')
 
     def handle_events(self, game):
         for event in pygame.event.get():
@@ -187,7 +354,7 @@ class Screen(object):
         x, y = event.pos
         if self.minimap_rect.collidepoint(x, y):
             self.handle_minimap_event(event, game)
-        if self.button_rect.collidepoint(x, y):
+        elif self.button_rect.collidepoint(x, y):
             self.handle_button_event(event, game)
         elif self.map_rect.collidepoint(x, y):
             if event.button == 1:
@@ -196,20 +363,7 @@ class Screen(object):
                 self.handle_command_event(event, game)
 
     def handle_select_event(self, event, game):
-        clicked_unit = None
-        clicked_unit_pos = None
-        for unit in game.units:
-            unit_pos = game.cell_to_point(unit.cell)
-            screen_pos = self.to_screen_coords(unit_pos,
-                                               self.map_panel.get_size())
-            surface = self.unit_images[type(unit)]
-            surface_size = surface.get_size()
-            rect = rect_from_center_and_size(screen_pos, surface_size)
-            if (rect_contains_point(rect, event.pos)
-                and (clicked_unit is None
-                     or unit_pos[1] < clicked_unit_pos[1])):
-                clicked_unit = unit
-                clicked_unit_pos = unit_pos
+        clicked_unit = self.pick_unit(game, event.pos)
 
         if clicked_unit is not None:
             if pygame.key.get_mods() & KMOD_SHIFT:
@@ -222,37 +376,33 @@ class Screen(object):
                 self.selection.add(clicked_unit)
 
     def handle_command_event(self, event, game):
-        clicked_unit = None
-        clicked_unit_pos = None
-        for unit in game.units:
-            unit_pos = game.cell_to_point(unit.cell)
-            screen_pos = self.to_screen_coords(unit_pos,
-                                               self.map_panel.get_size())
-            surface = self.unit_images[type(unit)]
-            surface_size = surface.get_size()
-            rect = rect_from_center_and_size(screen_pos, surface_size)
-            if (rect_contains_point(rect, event.pos)
-                and (clicked_unit is None
-                     or unit_pos[1] < clicked_unit_pos[1])):
-                clicked_unit = unit
-                clicked_unit_pos = unit_pos
+        clicked_unit = self.pick_unit(game, event.pos)
 
         point = self.to_world_coords(event.pos, self.map_panel.get_size())
         cell = game.point_to_cell(point)
+        flow = len(self.selection) > 1
         for unit in self.selection:
             if (unit.speed is not None
                 and (clicked_unit is None
                      or unit.color == clicked_unit.color)):
                 if not pygame.key.get_mods() & KMOD_SHIFT:
                     game.stop_unit(unit)
-                game.add_task(unit, Move(cell))
+                game.add_task(unit, Move(cell, flow=flow))
             elif unit.damage is not None and unit.color != clicked_unit.color:
                 if not pygame.key.get_mods() & KMOD_SHIFT:
                     game.stop_unit(unit)
                 game.add_task(unit, Attack(clicked_unit))
 
     def handle_minimap_event(self, event, game):
-        pass
+
+        # Center the map panel on the point that was clicked.
+        x, y = event.pos
+        point_x, point_y = self.get_minimap(game).to_world(
+            (x - self.minimap_rect.left, y - self.minimap_rect.top))
+        width, height = self.map_panel.get_size()
+        self.screen_x = int(point_x * self.PIXELS_PER_METER_X) - width // 2
+        self.screen_y = (int(height - point_y * self.PIXELS_PER_METER_Y)
+                         - height // 2)
 
     def handle_button_event(self, event, game):
         x, y = event.pos
@@ -280,61 +430,228 @@ class Screen(object):
     def handle_rect_event(self, old_pos, event, game):
         if not pygame.key.get_mods() & KMOD_SHIFT:
             self.selection.clear()
-        selection_rect = normalize_rect((old_pos, event.pos))
-        for unit in game.units:
-            unit_pos = game.cell_to_point(unit.cell)
-            screen_pos = self.to_screen_coords(unit_pos,
-                                               self.map_panel.get_size())
-            surface = self.unit_images[type(unit)]
-            surface_size = surface.get_size()
-            surface_rect = rect_from_center_and_size(screen_pos, surface_size)
-            if rect_intersects_rect(selection_rect, surface_rect):
-                self.selection.add(unit)
-
-    def update_screen(self, game):
-        self.paint_map_panel(game)
-        self.paint_control_panel(game)
-        pygame.display.update()
-
-    def paint_map_panel(self, game):
-        self.map_panel.fill(pygame.color.Color('#886644'))
-        for screen_y, screen_x, unit in self.sorted_units(game):
+        (min_x, min_y), (max_x, max_y) = normalize_rect((old_pos, event.pos))
+        offset_x, offset_y = self.screen_x, self.screen_y
+        self.selection |= self.picking_index(game).select(
+            ((min_x + offset_x, min_y + offset_y),
+             (max_x + offset_x, max_y + offset_y)))
+
+    def picking_index(self, game):
+
+        # The picking index has the rectangles of the unit sprites at their
+        # cells, on the screen as if it had not been scrolled.
+        def sprite_rect(unit):
+            x, y = game.cell_to_point(unit.cell)
+            screen_pos = (int(x * self.PIXELS_PER_METER_X),
+                          int(height - y * self.PIXELS_PER_METER_Y))
+            size = self.unit_images[type(unit)].get_size()
+            return rect_from_center_and_size(screen_pos, size)
+        height = self.map_panel.get_height()
+        if self.picking is None or self.picking.game is not game:
+            if self.picking is not None:
+                self.picking.close()
+            self.picking = PickingIndex(game, sprite_rect)
+        return self.picking
+
+    def pick_unit(self, game, pos):
+        x, y = pos
+        return self.picking_index(game).pick((x + self.screen_x,
+                                              y + self.screen_y))
+
+    def update_screen(self, game, alpha=0.0):
+
+        # Only the parts of the screen that changed since the last frame
+        # are repainted and passed to the display, except in the first one.
+        first_frame = self.drawn_scroll is None
+        rects = self.paint_map_panel(game, alpha)
+        rects.extend(self.paint_control_panel(game, rects))
+        if first_frame:
+            pygame.display.update()
+        elif rects:
+            pygame.display.update(rects)
+
+    def sprite_rect(self, screen_pos, area, selected):
+        x, y = screen_pos
+        width, height = area.size
+        rect = pygame.Rect(x - width // 2, y - height // 2, width, height)
+        if selected:
+            radius = max(width, height) // 2
+            rect.union_ip(pygame.Rect(x - radius, y - radius,
+                                      2 * radius, 2 * radius))
+        return rect
+
+    def selection_rect(self):
+        if self.mouse_button_down_pos is None:
+            return None
+        return normalize_rect_size(self.mouse_button_down_pos,
+                                   pygame.mouse.get_pos()).inflate(4, 4)
+
+    def paint_map_panel(self, game, alpha=0.0):
+
+        # Compare the rectangle and selection of every unit with the last
+        # frame, and repaint the union of the old and new rectangles of the
+        # units that changed. Overlapping dirty rectangles are merged, so
+        # that no pixel is painted twice. Scrolling repaints everything.
+        panel_rect = self.map_panel.get_rect()
+        drawn_units = {}
+        sprites = []
+        dirty = []
+        for screen_y, screen_x, unit in self.sorted_units(game, alpha):
             screen_pos = screen_x, screen_y
-            image = self.team_images[unit.color, type(unit)]
-            if unit in self.selection:
-                width, height = image.get_size()
+            surface, area = self.team_sprites[unit.color, type(unit)]
+            selected = unit in self.selection
+            rect = self.sprite_rect(screen_pos, area, selected)
+            state = rect, selected
+            old_state = self.drawn_units.get(unit)
+            if old_state != state:
+                dirty.append(rect)
+                if old_state is not None:
+                    dirty.append(old_state[0])
+            drawn_units[unit] = state
+            sprites.append((screen_pos, surface, area, selected, rect))
+        for unit, (rect, selected) in self.drawn_units.iteritems():
+            if unit not in drawn_units:
+                dirty.append(rect)
+        selection_rect = self.selection_rect()
+        if selection_rect != self.drawn_selection_rect:
+            dirty.extend(rect for rect in (selection_rect,
+                                           self.drawn_selection_rect)
+                         if rect is not None)
+        if self.drawn_scroll != (self.screen_x, self.screen_y):
+            dirty = [panel_rect]
+        self.drawn_units = drawn_units
+        self.drawn_selection_rect = selection_rect
+        self.drawn_scroll = self.screen_x, self.screen_y
+
+        dirty = merge_rects(rect.clip(panel_rect) for rect in dirty)
+        sprite_rects = [sprite[-1] for sprite in sprites]
+        for rect in dirty:
+            self.map_panel.set_clip(rect)
+            self.map_panel.fill(pygame.color.Color('#886644'), rect)
+            self.paint_sprites([sprites[i]
+                                for i in rect.collidelistall(sprite_rects)])
+            self.paint_selection_rect(game)
+        self.map_panel.set_clip(None)
+        offset = self.map_rect.topleft
+        return [rect.move(offset) for rect in dirty]
+
+    def paint_sprites(self, sprites):
+
+        # Collect the sprite blits and make them in batches, which are only
+        # broken up by the selection circles that go beneath units.
+        blits = []
+        for screen_pos, surface, area, selected, rect in sprites:
+            width, height = area.size
+            if selected:
+                self.blit_sprites(self.map_panel, blits)
+                del blits[:]
                 radius = max(width, height) // 2
                 pygame.draw.circle(self.map_panel, pygame.color.Color('black'),
                                    screen_pos, radius - 1, 3)
                 pygame.draw.circle(self.map_panel, pygame.color.Color('green'),
                                    screen_pos, radius - 2, 1)
-            self.paint_image(self.map_panel, image, screen_pos)
-        self.paint_selection_rect(game)
+            x, y = screen_pos
+            blits.append((surface, (x - width // 2, y - height // 2), area))
+        self.blit_sprites(self.map_panel, blits)
+
+    def blit_sprites(self, surface, blits):
+        if hasattr(surface, 'blits'):
+            surface.blits(blits, False)
+        else:
+            for source, dest, area in blits:
+                surface.blit(source, dest, area)
 
     def paint_selection_rect(self, game):
         if self.mouse_button_down_pos is not None:
-            old_x, old_y = self.mouse_button_down_pos
-            new_x, new_y = pygame.mouse.get_pos()
-            x = min(old_x, new_x)
-            y = min(old_y, new_y)
-            width = abs(old_x - new_x)
-            height = abs(old_y - new_y)
+            rect = normalize_rect_size(self.mouse_button_down_pos,
+                                       pygame.mouse.get_pos())
             pygame.draw.rect(self.map_panel, pygame.color.Color('black'),
-                             pygame.Rect(x, y, width, height), 3)
+                             rect, 3)
             pygame.draw.rect(self.map_panel, pygame.color.Color('green'),
-                             pygame.Rect(x, y, width, height), 1)
+                             rect, 1)
 
     def paint_button(self, button, image):
         row, col = divmod(button, 3)
         self.paint_image(self.button_panel, image,
                          (25 + col * 50, 25 + row * 50))
 
-    def paint_control_panel(self, game):
-        self.paint_minimap_panel(game)
-        self.paint_button_panel(game)
+    def paint_control_panel(self, game, map_rects):
+
+        # The panels are painted over the map panel, so they are repainted
+        # whenever it was painted beneath them, and the button panel also
+        # whenever its buttons change. The minimap image is updated at a
+        # lower rate than the frames.
+        rects = []
+        buttons = self.buttons(game)
+        if (buttons != self.drawn_buttons
+            or self.button_rect.collidelist(map_rects) != -1):
+            self.paint_button_panel(game, buttons)
+            self.drawn_buttons = buttons
+            rects.append(self.button_rect)
+        updated = self.update_minimap_image(game)
+        if updated or self.minimap_rect.collidelist(map_rects) != -1:
+            self.paint_minimap_panel(game)
+            rects.append(self.minimap_rect)
+        return rects
+
+    def get_minimap(self, game):
+        if self.minimap is None or self.minimap.game is not game:
+            if self.minimap is not None:
+                self.minimap.close()
+            self.minimap = Minimap(game, self.minimap_rect.size)
+        return self.minimap
+
+    def update_minimap_image(self, game):
+
+        # The background is cached until the minimap covers another part of
+        # the map, and the image with the units and the viewport on it is
+        # only redrawn if one of them changed, at most MINIMAP_FRAME_RATE
+        # times per second.
+        minimap = self.get_minimap(game)
+        width, height = self.map_panel.get_size()
+        viewport = (self.to_world_coords((0, 0), (width, height)),
+                    self.to_world_coords((width, height), (width, height)))
+        current_time = time.time()
+        if (self.minimap_image is not None
+            and (current_time < self.next_minimap_time
+                 or (not minimap.changed
+                     and minimap.version == self.drawn_minimap_version
+                     and viewport == self.drawn_minimap_viewport))):
+            return False
+        if minimap.version != self.drawn_minimap_version:
+            self.minimap_background = self.create_minimap_background(minimap)
+            self.drawn_minimap_version = minimap.version
+        image = self.minimap_background.copy()
+        cell_size = minimap.cell_size()
+        for color, cells in minimap.occupied_cells().iteritems():
+            team_color = self.team_colors[color]
+            for i, j in cells:
+                image.fill(team_color, (i * cell_size, j * cell_size,
+                                        cell_size, cell_size))
+        (left, top), (right, bottom) = [minimap.to_minimap(point)
+                                        for point in viewport]
+        pygame.draw.rect(image, pygame.color.Color('white'),
+                         pygame.Rect(int(left), int(top), int(right - left),
+                                     int(bottom - top)), 1)
+        self.minimap_image = image
+        self.drawn_minimap_viewport = viewport
+        minimap.changed = False
+        self.next_minimap_time = current_time + 1.0 / MINIMAP_FRAME_RATE
+        return True
+
+    def create_minimap_background(self, minimap):
+        background = pygame.Surface(self.minimap_rect.size)
+        background.fill(pygame.color.Color('gray'))
+        (min_x, min_y), (max_x, max_y) = minimap.extent()
+        left, top = minimap.to_minimap((min_x, max_y))
+        right, bottom = minimap.to_minimap((max_x, min_y))
+        background.fill(pygame.color.Color('#886644'),
+                        pygame.Rect(int(left), int(top), int(right - left),
+                                    int(bottom - top)))
+        return background
 
     def paint_minimap_panel(self, game):
-        self.minimap_panel.fill(pygame.color.Color('gray'))
+        self.minimap_panel.blit(self.minimap_image, (0, 0))
         pygame.draw.line(self.minimap_panel, pygame.color.Color('black'),
                          (0, 0), (self.minimap_rect.width, 0))
         pygame.draw.line(self.minimap_panel, pygame.color.Color('black'),
@@ -342,21 +659,29 @@ class Screen(object):
                          (self.minimap_rect.width - 1,
                           self.minimap_rect.height))
 
-    def paint_button_panel(self, game):
-        self.button_panel.fill(pygame.color.Color('gray'))
-        pygame.draw.line(self.button_panel, pygame.color.Color('black'),
-                         (0, 0), (self.button_rect.width, 0))
-        pygame.draw.line(self.button_panel, pygame.color.Color('black'),
-                         (0, 0), (0, self.button_rect.height))
+    def buttons(self, game):
         if len(self.selection) == 1:
             unit = list(self.selection)[0]
             if type(unit) is Tavern:
-                for button, cls in enumerate(Hero.__subclasses__()):
-                    if not game.tech_tree.veto(cls, game.forces[unit.color]):
-                        self.paint_button(button, self.unit_icons[cls])
+                return [(button, cls)
+                        for button, cls in enumerate(Hero.__subclasses__())
+                        if not game.tech_tree.veto(cls,
+                                                   game.forces[unit.color])]
             elif type(unit) is Monk:
-                for button, cls in enumerate(BUILDINGS):
-                    if not game.tech_tree.veto(cls, game.forces[unit.color]):
-                        self.paint_button(button, self.unit_icons[cls])
+                return [(button, cls) for button, cls in enumerate(BUILDINGS)
+                        if not game.tech_tree.veto(cls,
+                                                   game.forces[unit.color])]
             elif type(unit) is Priest:
-                self.paint_button(0, self.unit_icons[Golem])
+                return [(0, Golem)]
+        return []
+
+    def paint_button_panel(self, game, buttons=None):
+        if buttons is None:
+            buttons = self.buttons(game)
+        self.button_panel.fill(pygame.color.Color('gray'))
+        pygame.draw.line(self.button_panel, pygame.color.Color('black'),
+                         (0, 0), (self.button_rect.width, 0))
+        pygame.draw.line(self.button_panel, pygame.color.Color('black'),
+                         (0, 0), (0, self.button_rect.height))
+        for button, cls in buttons:
+            self.paint_button(button, self.unit_icons[cls])
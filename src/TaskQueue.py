@@ -0,0 +1,202 @@
+# Copyright (c) 2008 Mikael Lind
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+from collections import deque
+
+
+TASK_QUEUE_RESOLUTION = 0.01
+
+# Cancelled entries stay in their slots until popped, unless there are at
+# least this many of them and they make up this fraction of all entries.
+COMPACT_MIN_DEAD = 1024
+COMPACT_DEAD_RATIO = 0.5
+
+NEXT_TIME_WALK = 64
+
+
+class TaskQueue(object):
+
+    """Calendar queue of items scheduled at points in time.
+
+    Time is divided into slots of equal length, and every slot is a
+    first-in, first-out queue of the items scheduled within it, so that
+    pushing an item takes constant time. Items are popped slot by slot, and
+    in the order they were pushed within a slot. Empty slots take no space,
+    and long runs of them are skipped.
+
+    Cancelled entries are dead: they are skipped when popped, and removed
+    all at once when there are too many of them.
+    """
+
+    def __init__(self, resolution=TASK_QUEUE_RESOLUTION):
+
+        """Initialize the queue with the given slot length."""
+
+        self.__resolution = resolution
+        self.__slots = {}
+        self.__cursor = 0
+        self.__len = 0
+        self.__dead = 0
+        self.compactions = 0
+
+    def __len__(self):
+
+        """Return the number of items that have been pushed but not popped
+        or cancelled."""
+
+        return self.__len
+
+    def dead(self):
+
+        """Return the number of cancelled entries that are still stored."""
+
+        return self.__dead
+
+    def resolution(self):
+
+        """Return the slot length."""
+
+        return self.__resolution
+
+    def push(self, time, item):
+
+        """Schedule an item at the given time, and return its entry.
+
+        An item scheduled before the current slot is put in the current slot.
+        """
+
+        # Entries are lists of time, item and whether they are still queued,
+        # which are much cheaper to create than instances.
+        entry = [time, item, True]
+        slot = int(time // self.__resolution)
+        if slot < self.__cursor:
+            slot = self.__cursor
+        bucket = self.__slots.get(slot)
+        if bucket is None:
+            self.__slots[slot] = deque([entry])
+        else:
+            bucket.append(entry)
+        self.__len += 1
+        return entry
+
+    def cancel(self, entry):
+
+        """Cancel an entry returned by push, unless already popped."""
+
+        if entry[2]:
+            entry[2] = False
+            self.__len -= 1
+            self.__dead += 1
+
+    def entries(self):
+
+        """Return the queued entries in the order they would be popped."""
+
+        return [entry for slot in sorted(self.__slots)
+                for entry in self.__slots[slot] if entry[2]]
+
+    def next_time(self):
+
+        """Return the earliest time of any queued item, or None if empty."""
+
+        slots = self.__slots
+        if not self.__len:
+            return None
+
+        # Look at the slots in order, walking a few of them before falling
+        # back on searching all slots in use for the next one.
+        slot = self.__cursor
+        walked = 0
+        while True:
+            bucket = slots.get(slot)
+            if bucket is not None:
+                times = [entry[0] for entry in bucket if entry[2]]
+                if times:
+                    return min(times)
+            walked += 1
+            if walked < NEXT_TIME_WALK:
+                slot += 1
+            else:
+                slot = min(s for s in slots if s > slot)
+                walked = 0
+
+    def pop_due(self, now):
+
+        """Pop the items scheduled at or before the given time.
+
+        This generator yields the items slot by slot. Items that are pushed
+        while it runs are yielded as well if they are due.
+        """
+
+        # Compact before popping, since popping holds on to a slot.
+        dead = self.__dead
+        if (dead >= COMPACT_MIN_DEAD
+            and dead >= COMPACT_DEAD_RATIO * (self.__len + dead)):
+            self.__compact()
+        last = int(now // self.__resolution)
+        slots = self.__slots
+        while self.__cursor <= last:
+            slot = self.__cursor
+            bucket = slots.get(slot)
+            if bucket is None:
+                if last - slot > len(slots):
+                    # Jump to the next slot in use instead of walking a long
+                    # run of empty slots.
+                    pending = [s for s in slots if s <= last]
+                    self.__cursor = min(pending) if pending else last
+                elif slot < last:
+                    self.__cursor += 1
+                else:
+                    break
+                continue
+            later = None
+            popleft = bucket.popleft
+            while bucket:
+                entry = popleft()
+                if entry[2]:
+                    if entry[0] <= now:
+                        entry[2] = False
+                        self.__len -= 1
+                        yield entry[1]
+                    elif later is None:
+                        later = deque([entry])
+                    else:
+                        later.append(entry)
+                else:
+                    self.__dead -= 1
+            if later is None:
+                del slots[slot]
+            else:
+                slots[slot] = later
+            if slot == last:
+                break
+            self.__cursor += 1
+
+    def __compact(self):
+        for slot, bucket in self.__slots.items():
+            live = deque(entry for entry in bucket if entry[2])
+            if live:
+                self.__slots[slot] = live
+            else:
+                del self.__slots[slot]
+        self.__dead = 0
+        self.compactions += 1
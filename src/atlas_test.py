@@ -0,0 +1,69 @@
+# Copyright (c) 2008 Mikael Lind
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+from Atlas import pack
+
+
+def test_pack_without_overlaps():
+    sizes = dict(('image%d' % i, (10 + 7 * i % 23, 5 + 11 * i % 17))
+                 for i in xrange(40))
+    positions, height = pack(sizes, 64, 1)
+    rects = []
+    for name, (x, y) in positions.iteritems():
+        w, h = sizes[name]
+        assert 0 <= x and x + w <= 64
+        assert 0 <= y and y + h <= height
+        rects.append((x, y, x + w, y + h))
+    for i, a in enumerate(rects):
+        for b in rects[i + 1:]:
+            assert not (a[0] < b[2] + 1 and b[0] < a[2] + 1
+                        and a[1] < b[3] + 1 and b[1] < a[3] + 1)
+
+
+def test_pack_shelves():
+    positions, height = pack(dict(a=(30, 20), b=(30, 10), c=(30, 5)), 64, 2)
+    assert positions == dict(a=(0, 0), b=(32, 0), c=(0, 22))
+    assert height == 27
+
+
+def test_pack_too_wide():
+    try:
+        pack(dict(a=(65, 1)), 64)
+    except ValueError:
+        pass
+    else:
+        assert False
+
+
+def test():
+
+    print
+    print 'Running Atlas test suite...'
+
+    print 'Testing pack function...'
+    test_pack_without_overlaps()
+    test_pack_shelves()
+    test_pack_too_wide()
+
+
+if __name__ == '__main__':
+    test()
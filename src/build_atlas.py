@@ -0,0 +1,69 @@
+# Copyright (c) 2008 Mikael Lind
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+"""Pack the unit images, their team variants and icons into an atlas."""
+
+
+from optparse import OptionParser
+import os, sys
+
+import pygame
+
+from Atlas import build_atlas, write_atlas
+from Screen import (ATLAS_FILE_NAME, TEAM_COLORS, UNIT_CLASSES, atlas_key,
+                    create_unit_images, find_root, unit_images_key)
+
+
+def main():
+    root = find_root()
+    parser = OptionParser(usage='%prog [options]',
+                          description='Build the texture atlas of the unit '
+                                      'images.')
+    parser.add_option('-o', '--output',
+                      default=os.path.join(root, 'data', ATLAS_FILE_NAME),
+                      help='atlas file (default: %default)')
+    options, args = parser.parse_args()
+    if args:
+        parser.print_help(sys.stderr)
+        sys.exit(1)
+
+    # Converting images needs a display mode, but not a window.
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    pygame.display.init()
+    pygame.display.set_mode((1, 1))
+    images = {}
+    sources = {}
+    for cls in UNIT_CLASSES:
+        name = cls.__name__
+        for image_name, image in create_unit_images(root, name,
+                                                    TEAM_COLORS).iteritems():
+            images[atlas_key(name, image_name)] = image
+        sources[name] = unit_images_key(root, name, TEAM_COLORS)
+    atlas = build_atlas(images, sources=sources)
+    write_atlas(options.output, atlas)
+    width, height = atlas.surface.get_size()
+    sys.stdout.write('%d images in a %dx%d atlas: %s\n'
+                     % (len(images), width, height, options.output))
+
+
+if __name__ == '__main__':
+    main()
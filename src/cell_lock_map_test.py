@@ -0,0 +1,223 @@
+# Copyright (c) 2008 Mikael Lind
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+import random
+
+from CellLockMap import CellLockMap, SparseCellLockMap
+from config.units import Tavern, Warrior
+from HexGrid import HexGrid
+from Unit import Unit
+
+
+BOUNDS = (-5, -5), (5, 5)
+
+
+class LargeUnit(Unit):
+    large = True
+
+
+def create_maps():
+    return CellLockMap(BOUNDS), SparseCellLockMap(HexGrid())
+
+
+def test_bounds():
+    dense, sparse = create_maps()
+    assert dense.bounds() == BOUNDS
+    assert sparse.bounds() is None
+    assert (5, -5) in dense
+    assert (6, 0) not in dense
+    assert (6, 0) in sparse
+
+
+def test_lock_and_unlock():
+    for locks in create_maps():
+        a, b = Unit('red'), Unit('blue')
+        locks.lock(a, [(0, 0), (0, 1)])
+        assert locks.owner((0, 0)) is a
+        assert locks.owner((1, 0)) is None
+        assert locks.lockable(a, (0, 0))
+        assert not locks.lockable(b, (0, 0))
+        assert locks.lockable(b, (1, 0))
+        locks.unlock([(0, 0)])
+        assert locks.owner((0, 0)) is None
+        assert locks.lockable(b, (0, 0))
+
+
+def test_lockable_with_moving():
+    for locks in create_maps():
+        a, b = Unit('red'), Unit('blue')
+        a.cell_locks.add((0, 0))
+        locks.lock(a, a.cell_locks)
+        assert not locks.lockable(b, (0, 0), with_moving=True)
+        a.moving = True
+        locks.set_moving(a, True)
+        assert not locks.lockable(b, (0, 0))
+        assert locks.lockable(b, (0, 0), with_moving=True)
+
+
+def test_lockable_when_large():
+    for locks in create_maps():
+        a, b = Unit('red'), LargeUnit('blue')
+        locks.lock(a, [(0, 0)])
+        assert not locks.lockable(b, (0, 1))
+        assert locks.lockable(b, (0, 2))
+        locks.lock(b, [(0, 2)] + list(HexGrid().neighbors((0, 2))))
+        assert locks.lockable(b, (0, 2))
+        assert not locks.lockable(a, (1, 2))
+
+
+def test_lockable_outside_bounds():
+    dense, sparse = create_maps()
+    a, b = Unit('red'), LargeUnit('blue')
+    assert dense.lockable(a, (5, 5))
+    assert not dense.lockable(a, (6, 5))
+    assert dense.lockable(b, (4, 4))
+    assert not dense.lockable(b, (5, 4))
+    assert sparse.lockable(b, (5, 4))
+
+
+def test_lockable_when_large_and_moving():
+    for locks in create_maps():
+        a, b = Unit('red'), LargeUnit('blue')
+        a.cell_locks.add((0, 1))
+        locks.lock(a, a.cell_locks)
+        assert not locks.lockable(b, (0, 0), with_moving=True)
+        a.moving = True
+        locks.set_moving(a, True)
+        assert not locks.lockable(b, (0, 0))
+        assert locks.lockable(b, (0, 0), with_moving=True)
+
+
+def test_free():
+    for locks in create_maps():
+        a, b = Warrior('red'), Tavern('red')
+        locks.lock(a, [(0, 0)])
+        locks.lock(b, [(2, 2)])
+        assert locks.free((0, 0), False)
+        assert locks.free((0, 0), True)
+        assert not locks.free((2, 2), False)
+        assert not locks.free((2, 1), True)
+        assert locks.free((2, 1), False)
+        assert locks.free((2, 0), True)
+        locks.unlock([(2, 2)])
+        assert locks.free((2, 1), True)
+
+
+def test_free_outside_bounds():
+    dense, sparse = create_maps()
+    assert dense.free((5, 5), False)
+    assert not dense.free((6, 5), False)
+    assert dense.free((4, 4), True)
+    assert not dense.free((5, 4), True)
+    assert sparse.free((5, 4), True)
+
+
+def test_release():
+    dense, sparse = create_maps()
+    a, b = Unit('red'), Unit('blue')
+    dense.lock(a, [(0, 0)])
+    dense.unlock([(0, 0)])
+    dense.release(a)
+    dense.lock(b, [(1, 1)])
+    assert dense.owner((1, 1)) is b
+    assert not dense.lockable(a, (1, 1))
+
+
+def test_lock_all():
+    rng = random.Random(0)
+    units = ([Unit('red') for i in xrange(5)]
+             + [LargeUnit('blue') for i in xrange(3)] + [Tavern('green')])
+    cells = [(m, n) for m in xrange(-5, 6) for n in xrange(-5, 6)]
+    rng.shuffle(cells)
+    unit_cells = [(unit, cells[5 * i:5 * i + 5])
+                  for i, unit in enumerate(units)]
+    for unit in units:
+        unit.moving = rng.random() < 0.5
+    for locks, all_locks in zip(create_maps(), create_maps()):
+        for unit, cells in unit_cells:
+            locks.lock(unit, cells)
+        all_locks.lock_all(unit_cells)
+        for m in xrange(-6, 7):
+            for n in xrange(-6, 7):
+                cell = m, n
+                assert locks.owner(cell) is all_locks.owner(cell)
+                for unit in units:
+                    for with_moving in False, True:
+                        assert (locks.lockable(unit, cell, with_moving)
+                                == all_locks.lockable(unit, cell,
+                                                      with_moving))
+                    assert (locks.free(cell, unit.large)
+                            == all_locks.free(cell, unit.large))
+
+
+def test_same_as_sparse():
+    rng = random.Random(0)
+    dense, sparse = create_maps()
+    units = ([Unit('red') for i in xrange(5)]
+             + [LargeUnit('blue') for i in xrange(3)] + [Tavern('green')])
+    cells = [(m, n) for m in xrange(-5, 6) for n in xrange(-5, 6)]
+    for i in xrange(500):
+        unit = rng.choice(units)
+        cell = rng.choice(cells)
+        if dense.owner(cell) is None and rng.random() < 0.5:
+            for locks in dense, sparse:
+                locks.lock(unit, [cell])
+        elif dense.owner(cell) is not None and rng.random() < 0.3:
+            for locks in dense, sparse:
+                locks.unlock([cell])
+        unit.moving = rng.random() < 0.5
+        unit.cell_locks = set(cell for cell in cells
+                              if dense.owner(cell) is unit)
+        for locks in dense, sparse:
+            locks.set_moving(unit, unit.moving)
+        for other in units:
+            for with_moving in False, True:
+                for cell in rng.sample(cells, 10):
+                    m, n = cell
+                    if max(abs(m), abs(n)) < 5:
+                        assert (dense.lockable(other, cell, with_moving)
+                                == sparse.lockable(other, cell, with_moving))
+                        assert (dense.free(cell, other.large)
+                                == sparse.free(cell, other.large))
+
+
+def test():
+
+    print
+    print 'Running CellLockMap test suite...'
+
+    print 'Testing CellLockMap class...'
+    test_bounds()
+    test_lock_and_unlock()
+    test_lockable_with_moving()
+    test_lockable_when_large()
+    test_lockable_outside_bounds()
+    test_lockable_when_large_and_moving()
+    test_free()
+    test_free_outside_bounds()
+    test_release()
+    test_lock_all()
+    test_same_as_sparse()
+
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,77 @@
+# Copyright (c) 2008 Mikael Lind
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+from ClusterMap import ClusterMap
+from HexGrid import HexGrid
+from PathCache import RegionVersions
+
+
+def create_map(walls=()):
+    walls = set(walls)
+    def passable(cell):
+        return cell not in walls
+    return ClusterMap(HexGrid(), RegionVersions(4), passable)
+
+
+def test_find_path_in_same_cluster():
+    c = create_map()
+    assert c.find_path((0, 0), (3, 3), lambda cell: True) == [(3, 3)]
+
+
+def test_find_path_across_clusters():
+    c = create_map()
+    path = c.find_path((0, 0), (20, 0), lambda cell: True)
+    assert path[-1] == (20, 0)
+    assert len(path) < 20
+
+
+def test_find_path_around_wall():
+    walls = [(6, n) for n in xrange(-8, 12)]
+    c = create_map(walls)
+    path = c.find_path((0, 0), (12, 0), lambda cell: True)
+    assert path[-1] == (12, 0)
+    assert not set(path) & set(walls)
+    assert any(n >= 12 or n < -8 for m, n in path)
+
+
+def test_find_path_when_enclosed():
+    walls = [(m, n) for m in xrange(-4, 8) for n in xrange(-4, 8)
+             if max(abs(m - 2), abs(n - 2)) == 5]
+    c = create_map(walls)
+    path = c.find_path((2, 2), (20, 20), lambda cell: cell not in walls)
+    assert (20, 20) not in path
+
+
+def test():
+
+    print
+    print 'Running ClusterMap test suite...'
+
+    print 'Testing ClusterMap class...'
+    test_find_path_in_same_cluster()
+    test_find_path_across_clusters()
+    test_find_path_around_wall()
+    test_find_path_when_enclosed()
+
+
+if __name__ == '__main__':
+    test()
@@ -25,15 +25,73 @@ from collections import deque
 from Task import Task
 
 
+# A unit following a flow field waits this long for other units to clear the
+# way, at most this many times in a row, before it searches for a path of its
+# own around them.
+FLOW_WAIT_TIME = 0.1
+FLOW_MAX_WAITS = 10
+
+
 class Move(Task):
 
-    def __init__(self, goal):
+    def __init__(self, goal, flow=False, replan=False):
         Task.__init__(self)
         self.goal = goal
+        self.flow = flow
+        self.replan = replan
+        self.planner = None
         self.path_request = None
         self.path = deque()
         self.stuck = False
+        self.waits = 0
+        self.update = self.__follow_field if flow else self.__request_path
+
+    def __follow_field(self):
+        if self.goal is None or self.unit.cell == self.goal:
+            self.game.set_moving(self.unit, False)
+            self.game.remove_task(self)
+            return
+        field = self.game.flow_field(self.goal, self.unit.large,
+                                     self.unit.cell)
+        if self.unit.cell in field and field.arrived(self.unit.cell):
+            self.game.set_moving(self.unit, False)
+            self.game.remove_task(self)
+            return
+        if self.unit.cell in field:
+            next_cells = field.next_cells(self.unit.cell)
+            for cell in next_cells:
+                if self.game.lockable_cell(self.unit, cell):
+                    self.waits = 0
+                    self.__step(cell)
+                    return
+
+            # Wait for units that are stepping out of the way. Otherwise,
+            # step aside to get around units that are standing still.
+            self.game.set_moving(self.unit, False)
+            if self.waits < FLOW_MAX_WAITS:
+                if any(self.game.lockable_cell(self.unit, cell,
+                                               with_moving=True)
+                       for cell in next_cells):
+                    self.waits += 1
+                    self.game.schedule_task(self, FLOW_WAIT_TIME)
+                    return
+                for cell in field.side_cells(self.unit.cell):
+                    if self.game.lockable_cell(self.unit, cell):
+                        self.waits += 1
+                        self.__step(cell)
+                        return
+                if next_cells:
+                    self.waits += 1
+                    self.game.schedule_task(self, FLOW_WAIT_TIME)
+                    return
+        self.game.set_moving(self.unit, False)
         self.update = self.__request_path
+        self.game.schedule_task(self)
+
+    def __step(self, cell):
+        self.game.set_moving(self.unit, True)
+        self.game.add_cell_locks(self.unit, cell)
+        self.game.call_task(self.unit, Step(cell))
 
     def __request_path(self):
         if self.goal is None:
@@ -47,7 +105,7 @@ class Move(Task):
         self.path.clear()
         self.path.extend(path)
         if self.path:
-            self.unit.moving = True
+            self.game.set_moving(self.unit, True)
             self.update = self.__follow_path
             self.game.schedule_task(self)
         elif self.stuck:
@@ -63,11 +121,34 @@ class Move(Task):
             dest = self.path.popleft()
             self.game.add_cell_locks(self.unit, dest)
             self.game.call_task(self.unit, Step(dest))
+        elif self.replan and self.path and self.__repair_path():
+            self.game.schedule_task(self)
         else:
-            self.unit.moving = False
-            self.update = self.__request_path
+            self.game.set_moving(self.unit, False)
+            if self.flow and not self.path:
+                self.waits = 0
+                self.update = self.__follow_field
+            else:
+                self.update = self.__request_path
             self.game.schedule_task(self)
 
+    def __repair_path(self):
+
+        # Keep the search for the end of the current path, and only repair
+        # the parts of it that are affected by changed cells.
+        goal = self.path[-1]
+        if self.planner is None or self.planner.goal() != goal:
+            self.planner = self.game.create_planner(self.unit, goal)
+            path = self.planner.find_path()
+        else:
+            path = self.planner.replan(self.unit.cell, self.path)
+        if not path or not self.game.lockable_cell(self.unit, path[0]):
+            self.planner = None
+            return False
+        self.path.clear()
+        self.path.extend(path)
+        return True
+
     def abort(self):
         if self.path_request is not None:
             self.game.remove_path_request(self.path_request)
@@ -97,7 +178,7 @@ class Step(Task):
         self.game.schedule_task(self, self.step_time)
 
     def __arrive(self):
-        self.unit.cell = self.dest
+        self.game.move_unit(self.unit, self.dest)
         self.game.normalize_cell_locks(self.unit)
         self.game.remove_task(self)
 
@@ -0,0 +1,130 @@
+# Copyright (c) 2008 Mikael Lind
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+import random
+
+from DStarLite import DStarLite
+from HexGrid import HexGrid
+from HexPathFinder import HexPathFinder
+from PathCache import RegionVersions
+
+
+SIZE = 8
+LIMIT = 10000
+
+
+def inside(cell):
+    m, n = cell
+    return abs(m) <= SIZE and abs(n) <= SIZE
+
+
+def is_path(start, path, passable):
+    grid = HexGrid()
+    return all(grid.cell_dist(a, b) == 1 and passable(b)
+               for a, b in zip([start] + path, path))
+
+
+def fresh_path(start, goal, passable):
+    path = HexPathFinder(2 * SIZE + 1).find_path(start, goal, passable)
+    if start != goal and (not path or path[-1] != goal):
+        return None
+    return path
+
+
+def test_find_path_when_open():
+    planner = DStarLite(HexGrid(), (0, 0), (3, -1), inside, LIMIT)
+    path = planner.find_path()
+    assert len(path) == 3
+    assert path[-1] == (3, -1)
+    assert is_path((0, 0), path, inside)
+
+
+def test_find_path_around_wall():
+    walls = set((1, n) for n in xrange(-3, 4))
+    def passable(cell):
+        return inside(cell) and cell not in walls
+    planner = DStarLite(HexGrid(), (0, 0), (3, 0), passable, LIMIT)
+    path = planner.find_path()
+    assert is_path((0, 0), path, passable)
+    assert len(path) == len(fresh_path((0, 0), (3, 0), passable))
+
+
+def test_replan_when_wall_removed():
+    walls = set((1, n) for n in xrange(-3, 4))
+    def passable(cell):
+        return inside(cell) and cell not in walls
+    versions = RegionVersions(4)
+    planner = DStarLite(HexGrid(), (0, 0), (3, 0), passable, LIMIT,
+                        versions)
+    assert len(planner.find_path()) > 3
+
+    # The wall is far from the start and off the current path, so it is
+    # only looked at again because its regions have changed.
+    walls.clear()
+    versions.bump([(1, n) for n in xrange(-3, 4)])
+    path = planner.replan((0, 0), [])
+    assert len(path) == 3
+
+
+def test_replan_same_as_fresh_search():
+    rng = random.Random(0)
+    cells = [(m, n) for m in xrange(-SIZE, SIZE + 1)
+             for n in xrange(-SIZE, SIZE + 1)]
+    start, goal = (-SIZE, 0), (SIZE, 0)
+    walls = set(cell for cell in rng.sample(cells, 80)
+                if cell not in (start, goal))
+    def passable(cell):
+        return inside(cell) and cell not in walls
+    versions = RegionVersions(4)
+    planner = DStarLite(HexGrid(), start, goal, passable, LIMIT, versions)
+    path = planner.find_path()
+    for i in xrange(50):
+        changed = [cell for cell in rng.sample(cells, 10)
+                   if cell not in (start, goal)]
+        walls.symmetric_difference_update(changed)
+        versions.bump(changed)
+        if path and passable(path[0]) and rng.random() < 0.2:
+            start = path[0]
+        path = planner.replan(start, [])
+        expected = fresh_path(start, goal, passable)
+        if expected is None:
+            assert path is None
+        else:
+            assert is_path(start, path, passable)
+            assert ([start] + path)[-1] == goal
+            assert len(path) == len(expected)
+
+
+def test():
+
+    print
+    print 'Running DStarLite test suite...'
+
+    print 'Testing DStarLite class...'
+    test_find_path_when_open()
+    test_find_path_around_wall()
+    test_replan_when_wall_removed()
+    test_replan_same_as_fresh_search()
+
+
+if __name__ == '__main__':
+    test()
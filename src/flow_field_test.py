@@ -0,0 +1,89 @@
+# Copyright (c) 2008 Mikael Lind
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+from config.tasks import Move
+from config.units import Tavern, Warrior
+from FlowField import FlowField
+from Game import Game
+from HexGrid import HexGrid
+
+
+def test_extend():
+    grid = HexGrid()
+    walls = set((2, n) for n in xrange(-5, 6))
+    field = FlowField(grid, (0, 0), lambda cell: cell not in walls)
+    assert field.extend((5, 0))
+    assert (5, 0) in field
+    assert not walls & set(field.cells())
+    assert field.dist((5, 0)) > grid.cell_dist((5, 0), (0, 0))
+    assert not field.extend((5, 0))
+    assert field.next_cells((1, 0)) == [(0, 0)]
+    assert field.arrived((0, 0)) and not field.arrived((1, 0))
+
+
+def test_building_goal():
+    for bounds in (None, ((-20, -20), (20, 20))):
+        game = Game(bounds)
+        tavern = Tavern('cyan')
+        game.add_unit(tavern, (0, 0))
+        for large in (False, True):
+            field = game.flow_field(tavern.cell, large, (10, 0))
+            assert (10, 0) in field
+            assert len(field) > 100
+            border = [n for cell in tavern.cell_locks
+                      for n in HexGrid().neighbors(cell)
+                      if n not in tavern.cell_locks]
+            if not large:
+                assert all(cell in field for cell in border)
+                assert all(field.arrived(cell) for cell in border)
+            assert not field.arrived((10, 0))
+
+
+def test_building_goal_move():
+    game = Game()
+    tavern = Tavern('cyan')
+    game.add_unit(tavern, (0, 0))
+    warrior = Warrior('cyan')
+    game.add_unit(warrior, (10, 0))
+    game.path_time_budget = None
+    game.add_task(warrior, Move(tavern.cell, flow=True))
+    for i in xrange(500):
+        game.update(0.02)
+    assert not warrior.task_stack
+    assert min(game.cell_dist(warrior.cell, cell)
+               for cell in tavern.cell_locks) == 1
+    assert game.path_stats.served == 0
+
+
+def test():
+
+    print
+    print 'Running FlowField test suite...'
+
+    print 'Testing FlowField class...'
+    test_extend()
+    test_building_goal()
+    test_building_goal_move()
+
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,293 @@
+# Copyright (c) 2008 Mikael Lind
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+from config.tasks import Attack, Move
+from config.units import Ranger, Tavern, Warrior
+from Game import IDLE_SCAN_INTERVAL, PATH_NODE_BUDGET, Game
+from headless import create_game, first_divergence, run
+from Task import Task
+
+
+TIME_STEP = 0.1
+
+
+def run_idle_scans(game):
+    for i in xrange(int(IDLE_SCAN_INTERVAL / TIME_STEP) + 2):
+        game.update(TIME_STEP)
+
+
+def target(unit):
+    if unit.task_stack and isinstance(unit.task_stack[0], Attack):
+        return unit.task_stack[0].target
+    return None
+
+
+def test_idle_unit_attacks_enemy_in_range():
+    for bounds in (None, ((-10, -10), (10, 10))):
+        game = Game(bounds)
+        warrior, ranger = Warrior('yellow'), Ranger('yellow')
+        enemy, building = Warrior('cyan'), Tavern('cyan')
+        game.add_unit(warrior, (0, 0))
+        game.add_unit(ranger, (-4, 0))
+        game.add_unit(enemy, (1, 0))
+        game.add_unit(building, (0, 4))
+        run_idle_scans(game)
+        assert target(warrior) is enemy
+        assert target(ranger) is enemy
+        assert target(enemy) is warrior
+        assert not building.task_stack
+
+
+def test_idle_unit_ignores_enemy_out_of_range():
+    game = Game()
+    warrior, enemy = Warrior('yellow'), Warrior('cyan')
+    game.add_unit(warrior, (0, 0))
+    game.add_unit(enemy, (4, 0))
+    run_idle_scans(game)
+    assert not warrior.task_stack
+    assert not enemy.task_stack
+
+    # Idle units are scanned again, and find enemies that come close.
+    other = Warrior('cyan')
+    game.add_unit(other, (1, 0))
+    run_idle_scans(game)
+    assert target(warrior) is other
+
+
+def test_idle_unit_ignores_own_team():
+    game = Game()
+    units = [Warrior('yellow') for i in xrange(3)] + [Tavern('yellow')]
+    for i, unit in enumerate(units):
+        game.add_unit(unit, (i, 0))
+    run_idle_scans(game)
+    assert not any(unit.task_stack for unit in units)
+
+
+def create_seeded_games(orders):
+    return [create_game(1, 10, 2, orders, spread=10.0, seed=7)
+            for i in xrange(2)]
+
+
+def test_seeded_games_are_reproducible():
+    assert Game(seed=0).path_time_budget is None
+    assert Game().path_time_budget is not None
+    for orders in ('move', 'flow', 'attack'):
+        games = create_seeded_games(orders)
+        for i in xrange(200):
+            for game in games:
+                game.update(TIME_STEP)
+            assert games[0].state_hash() == games[1].state_hash()
+
+
+def test_first_divergence():
+    def create():
+        return create_game(1, 5, 2, 'attack', spread=10.0, seed=7)
+    assert first_divergence(create, 50) is None
+
+    # The second game wounds a unit right after its seventh tick.
+    games = []
+    def create_changed():
+        game = create()
+        if games:
+            unit = min(game.units, key=lambda unit: unit.cell)
+            update = game.update
+            ticks = []
+            def update_and_wound(time_step):
+                update(time_step)
+                ticks.append(time_step)
+                if len(ticks) == 7:
+                    unit.health -= 0.1
+            game.update = update_and_wound
+        games.append(game)
+        return game
+    assert first_divergence(create_changed, 50, TIME_STEP) == 7
+
+
+class Alarm(Task):
+
+    def __init__(self, delay):
+        Task.__init__(self)
+        self.delay = delay
+        self.times = []
+
+    def update(self):
+        self.times.append(self.game.time)
+        if len(self.times) == 1:
+            self.game.schedule_task(self, self.delay)
+        else:
+            self.game.remove_task(self)
+
+
+def test_fast_forward_same_as_update():
+    for orders in ('idle', 'move', 'attack'):
+        games = [create_game(1, 5, 2, orders, spread=10.0, seed=7)
+                 for i in xrange(2)]
+        run(games[0], 600, TIME_STEP, fast_forward=True)
+        run(games[1], 600, TIME_STEP)
+        assert games[0].time == games[1].time
+        assert games[0].state_hash() == games[1].state_hash()
+        assert games[1].skipped_ticks == 0
+    assert games[0].skipped_ticks > 0
+
+
+def test_fast_forward_with_path_request():
+    game = Game(seed=0)
+    warrior = Warrior('yellow')
+    game.add_unit(warrior, (0, 0))
+    game.add_task(warrior, Move((20, 0)))
+    game.update(TIME_STEP)
+    assert game.path_stats.backlog == 1
+    assert game.fast_forward(TIME_STEP, 10) == 0
+    game.update(TIME_STEP)
+    assert game.path_stats.backlog == 0
+
+
+def test_fast_forward_to_scheduled_task():
+    alarms = []
+    games = []
+    for i in xrange(2):
+        game = Game(seed=0)
+        tavern = Tavern('yellow')
+        game.add_unit(tavern, (0, 0))
+        alarm = Alarm(3.0)
+        game.add_task(tavern, alarm)
+        alarms.append(alarm)
+        games.append(game)
+    run(games[0], 100, TIME_STEP, fast_forward=True)
+    run(games[1], 100, TIME_STEP)
+    assert games[0].skipped_ticks > 0
+    assert alarms[0].times == alarms[1].times
+    assert len(alarms[0].times) == 2
+    assert games[0].time == games[1].time
+    assert games[0].state_hash() == games[1].state_hash()
+
+    # The tick at which the task is due is updated, not skipped.
+    game = Game(seed=0)
+    tavern = Tavern('yellow')
+    game.add_unit(tavern, (0, 0))
+    alarm = Alarm(1.0)
+    game.add_task(tavern, alarm)
+    game.update(TIME_STEP)
+    skipped = game.fast_forward(TIME_STEP, 100)
+    assert 0 < skipped < 100
+    assert len(alarm.times) == 1
+    game.update(TIME_STEP)
+    assert len(alarm.times) == 2
+    assert alarm.times[1] >= alarm.times[0] + 1.0
+
+
+def create_move_game(rows, cols):
+
+    # Units spaced out on a grid, each moving two cells to the right, so
+    # that every request is served once and no unit gets in the way.
+    game = Game(seed=0)
+    for i in xrange(rows):
+        for j in xrange(cols):
+            warrior = Warrior('yellow')
+            game.add_unit(warrior, (3 * i, 3 * j))
+            game.add_task(warrior, Move((3 * i + 2, 3 * j)))
+    game.update(TIME_STEP)
+    assert game.path_stats.backlog == rows * cols
+    return game
+
+
+def test_path_requests_served_within_node_budget():
+    game = create_move_game(20, 10)
+    assert game.path_time_budget is None
+    requests = [(unit.task_stack[0], unit.task_stack[0].path_request)
+                for unit in game.units]
+    for i in xrange(5):
+        game.update(TIME_STEP)
+        assert 0 < game.path_stats.nodes_last_update
+        if all(move.path_request is not request
+               for move, request in requests):
+            break
+    else:
+        assert False
+    assert game.path_stats.served == 200
+
+    game = create_move_game(20, 10)
+    game.path_node_budget = None
+    game.update(TIME_STEP)
+    assert game.path_stats.served_last_update == 200
+    assert game.path_stats.nodes_last_update > PATH_NODE_BUDGET
+
+
+def test_path_node_budget():
+
+    # Units only arrive and ask for paths again after several ticks.
+    game = create_move_game(20, 10)
+    game.path_node_budget = 100
+    served = 0
+    for i in xrange(5):
+        game.update(TIME_STEP)
+        stats = game.path_stats
+        assert stats.nodes_last_update >= 100
+        assert 0 < stats.served_last_update < 100
+        served += stats.served_last_update
+        assert stats.served == served
+        assert stats.backlog == 200 - served
+
+
+def test_path_stats():
+    game = create_move_game(1, 3)
+    game.path_node_budget = 0
+    stats = game.path_stats
+    for backlog in (2, 1, 0):
+        game.update(TIME_STEP)
+        assert stats.served_last_update == 1
+        assert stats.backlog == backlog
+    assert stats.served == 3
+    assert abs(stats.total_latency - 6 * TIME_STEP) < 1e-9
+    assert abs(stats.max_latency - 3 * TIME_STEP) < 1e-9
+    assert abs(stats.mean_latency() - 2 * TIME_STEP) < 1e-9
+    game.update(TIME_STEP)
+    assert stats.served_last_update == 0 and stats.nodes_last_update == 0
+
+
+def test():
+
+    print
+    print 'Running Game test suite...'
+
+    print 'Testing idle auto-targeting...'
+    test_idle_unit_attacks_enemy_in_range()
+    test_idle_unit_ignores_enemy_out_of_range()
+    test_idle_unit_ignores_own_team()
+
+    print 'Testing deterministic updates...'
+    test_seeded_games_are_reproducible()
+    test_first_divergence()
+
+    print 'Testing fast forward...'
+    test_fast_forward_same_as_update()
+    test_fast_forward_with_path_request()
+    test_fast_forward_to_scheduled_task()
+
+    print 'Testing path request budgets...'
+    test_path_requests_served_within_node_budget()
+    test_path_node_budget()
+    test_path_stats()
+
+
+if __name__ == '__main__':
+    test()
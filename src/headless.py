@@ -0,0 +1,249 @@
+# Copyright (c) 2008 Mikael Lind
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""Run the simulation without a screen and measure its throughput."""
+
+
+from __future__ import division
+from math import cos, pi, sin
+from optparse import OptionParser
+import random, resource, sys, time
+
+from config.tasks import Attack, Move
+from config.units import Hero, Tavern
+from Game import Game, PATH_TIME_BUDGET
+
+
+TIME_STEP = 0.02
+COLORS = 'cyan', 'yellow', 'red', 'green'
+ORDERS = 'idle', 'move', 'flow', 'replan', 'attack'
+
+# A dense map extends this many cells beyond the bases on every side.
+MAP_MARGIN = 20
+
+
+def create_game(taverns=1, heroes=10, forces=2, orders='attack',
+                spread=20.0, seed=0, dense=False):
+
+    """Create a game with the given number of taverns and heroes per force.
+
+    The forces are placed evenly on a circle with the given radius. Move
+    orders send every hero to the base of the next force, flow and replan
+    orders do the same with a shared flow field or with incremental
+    replanning, and attack orders send every hero after a random enemy unit.
+    A dense game has a bounded map that covers the bases with a margin.
+    """
+
+    rng = random.Random(seed)
+    game = Game(map_bounds(spread) if dense else None, seed)
+    hero_classes = Hero.__subclasses__()
+    bases = []
+    for i in xrange(forces):
+        angle = 2 * pi * i / forces
+        bases.append((spread * (1 + cos(angle)), spread * (1 + sin(angle))))
+    units = []
+    for i, color in enumerate(COLORS[:forces]):
+        base_cell = game.point_to_cell(bases[i])
+        for j in xrange(taverns):
+            game.add_unit(Tavern(color), base_cell)
+        for j in xrange(heroes):
+            hero = hero_classes[j % len(hero_classes)](color)
+            game.add_unit(hero, base_cell)
+            units.append(hero)
+    for hero in units:
+        if orders in ('move', 'flow', 'replan'):
+            i = COLORS.index(hero.color)
+            goal = bases[(i + 1) % forces]
+            game.add_task(hero, Move(game.point_to_cell(goal),
+                                     flow=(orders == 'flow'),
+                                     replan=(orders == 'replan')))
+        elif orders == 'attack':
+            enemies = [u for u in game.units if u.color != hero.color]
+            if enemies:
+                enemies.sort(key=lambda u: u.cell)
+                game.add_task(hero, Attack(rng.choice(enemies)))
+    return game
+
+
+def map_bounds(spread, margin=MAP_MARGIN):
+
+    """Return the lowest and highest cells of a map for the given spread."""
+
+    game = Game()
+    cells = [game.point_to_cell((x, y)) for x in (0, 2 * spread)
+             for y in (0, 2 * spread)]
+    ms, ns = zip(*cells)
+    return ((min(ms) - margin, min(ns) - margin),
+            (max(ms) + margin, max(ns) + margin))
+
+
+def run(game, ticks, time_step=TIME_STEP, fast_forward=False):
+
+    """Step the game for the given number of ticks as fast as possible.
+
+    Return a list with the wall time in seconds spent on each tick that was
+    updated. If fast_forward is true, ticks without anything to do are
+    skipped, and the time spent skipping them is added to the tick after
+    them, or to the last tick.
+    """
+
+    tick_times = []
+    i = 0
+    while i < ticks:
+        start_time = time.time()
+        if fast_forward:
+            i += game.fast_forward(time_step, ticks - i)
+            if i == ticks:
+                if tick_times:
+                    tick_times[-1] += time.time() - start_time
+                break
+        game.update(time_step)
+        i += 1
+        tick_times.append(time.time() - start_time)
+    return tick_times
+
+
+def first_divergence(create, ticks, time_step=TIME_STEP):
+
+    """Step two games from create() side by side, comparing state hashes.
+
+    Return the first tick at which the hashes differ, counting from 1, or
+    None if they never do. Path requests are served without a time budget,
+    since that depends on the wall clock.
+    """
+
+    games = create(), create()
+    for game in games:
+        game.path_time_budget = None
+    for i in xrange(1, ticks + 1):
+        for game in games:
+            game.update(time_step)
+        if games[0].state_hash() != games[1].state_hash():
+            return i
+    return None
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+
+def peak_memory():
+
+    """Return the peak resident set size of this process in kilobytes."""
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def report(tick_times, skipped_ticks=0, out=sys.stdout):
+    total_time = sum(tick_times)
+    ticks = len(tick_times) + skipped_ticks
+    ticks_per_sec = ticks / total_time if total_time else 0.0
+    out.write('ticks:        %d (%d skipped)\n' % (ticks, skipped_ticks))
+    out.write('wall time:    %.3f s\n' % total_time)
+    out.write('ticks/sec:    %.1f\n' % ticks_per_sec)
+    out.write('tick p50:     %.3f ms\n'
+              % (percentile(tick_times, 0.5) * 1000))
+    out.write('tick p99:     %.3f ms\n'
+              % (percentile(tick_times, 0.99) * 1000))
+    out.write('peak memory:  %d KB\n' % peak_memory())
+
+
+def report_paths(game, out=sys.stdout):
+    stats = game.path_stats
+    out.write('paths served: %d\n' % stats.served)
+    out.write('path backlog: %d\n' % stats.backlog)
+    out.write('path latency: %.3f s mean, %.3f s max\n'
+              % (stats.mean_latency(), stats.max_latency))
+    cache = game.path_cache
+    out.write('path cache:   %d hits, %d misses (%.1f%%), %d invalidated\n'
+              % (cache.hits, cache.misses, 100 * cache.hit_ratio(),
+                 cache.invalidations))
+
+
+def report_tasks(game, out=sys.stdout):
+    queue = game.task_queue
+    out.write('task queue:   %d live, %d dead, %d compactions\n'
+              % (len(queue), queue.dead(), queue.compactions))
+
+
+def main():
+    parser = OptionParser(usage='%prog [options]',
+                          description='Run a headless simulation benchmark.')
+    parser.add_option('-t', '--taverns', type='int', default=1,
+                      help='taverns per force (default: %default)')
+    parser.add_option('-u', '--heroes', type='int', default=10,
+                      help='heroes per force (default: %default)')
+    parser.add_option('-f', '--forces', type='int', default=2,
+                      help='number of forces, at most 4 (default: %default)')
+    parser.add_option('-o', '--orders', choices=ORDERS, default='attack',
+                      help='idle, move, flow, replan or attack '
+                           '(default: %default)')
+    parser.add_option('-n', '--ticks', type='int', default=500,
+                      help='number of ticks to run (default: %default)')
+    parser.add_option('-s', '--seed', type='int', default=0,
+                      help='scenario seed (default: %default)')
+    parser.add_option('-d', '--dense', action='store_true', default=False,
+                      help='use a bounded map with dense cell locks')
+    parser.add_option('-F', '--fast-forward', action='store_true',
+                      default=False,
+                      help='skip ticks without any scheduled events')
+    parser.add_option('-D', '--deterministic', action='store_true',
+                      default=False,
+                      help='serve path requests without a time budget')
+    parser.add_option('-c', '--check', action='store_true', default=False,
+                      help='run the scenario twice and report the first '
+                           'tick where the states differ')
+    options, args = parser.parse_args()
+    if args or not 1 <= options.forces <= len(COLORS):
+        parser.print_help(sys.stderr)
+        sys.exit(1)
+
+    def create():
+        return create_game(options.taverns, options.heroes, options.forces,
+                           options.orders, seed=options.seed,
+                           dense=options.dense)
+    if options.check:
+        tick = first_divergence(create, options.ticks)
+        if tick is None:
+            sys.stdout.write('no divergence in %d ticks\n' % options.ticks)
+        else:
+            sys.stdout.write('diverged at tick %d\n' % tick)
+            sys.exit(1)
+        return
+
+    setup_time = time.time()
+    game = create()
+    if not options.deterministic:
+        game.path_time_budget = PATH_TIME_BUDGET
+    setup_time = time.time() - setup_time
+    sys.stdout.write('units:        %d\n' % len(game.units))
+    sys.stdout.write('setup time:   %.3f s\n' % setup_time)
+    tick_times = run(game, options.ticks, fast_forward=options.fast_forward)
+    report(tick_times, game.skipped_ticks)
+    report_paths(game)
+    report_tasks(game)
+
+
+if __name__ == '__main__':
+    main()
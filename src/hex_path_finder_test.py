@@ -0,0 +1,133 @@
+# Copyright (c) 2008 Mikael Lind
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+import random
+
+from HexGrid import HexGrid
+from HexPathFinder import HexPathFinder
+from shortest_path import shortest_path
+
+
+def is_path(start, path, passable):
+    grid = HexGrid()
+    return all(grid.cell_dist(a, b) == 1 and passable(b)
+               for a, b in zip([start] + path, path))
+
+
+def test_find_path_when_open():
+    f = HexPathFinder(10)
+    path = f.find_path((0, 0), (3, -1), lambda cell: True)
+    assert len(path) == 3
+    assert path[-1] == (3, -1)
+    assert is_path((0, 0), path, lambda cell: True)
+
+
+def test_find_path_when_start_is_goal():
+    f = HexPathFinder(10)
+    assert f.find_path((2, 2), (2, 2), lambda cell: True) == []
+
+
+def test_find_path_around_wall():
+    walls = set((1, n) for n in xrange(-3, 4))
+    passable = lambda cell: cell not in walls
+    f = HexPathFinder(10)
+    path = f.find_path((0, 0), (2, 0), passable)
+    assert path[-1] == (2, 0)
+    assert is_path((0, 0), path, passable)
+
+
+def test_blocked_cells():
+    walls = set((1, n) for n in xrange(-3, 4))
+    f = HexPathFinder(10)
+    f.find_path((0, 0), (2, 0), lambda cell: cell not in walls)
+    blocked = f.blocked_cells()
+    assert (1, 0) in blocked
+    assert set(blocked) <= walls
+    assert not set(blocked) & set(f.cells())
+    f.find_path((0, 0), (2, 0), lambda cell: True)
+    assert f.blocked_cells() == []
+
+
+def test_find_path_when_unreachable():
+    f = HexPathFinder(10)
+    path = f.find_path((0, 0), (5, 0), lambda cell: cell != (5, 0))
+    assert HexGrid().cell_dist(path[-1], (5, 0)) == 1
+
+
+def test_find_path_beyond_radius():
+    f = HexPathFinder(5)
+    path = f.find_path((0, 0), (20, 0), lambda cell: True)
+    assert path
+    assert is_path((0, 0), path, lambda cell: True)
+
+
+def test_find_path_reuse():
+    f = HexPathFinder(10)
+    f.find_path((0, 0), (4, 4), lambda cell: True)
+    path = f.find_path((1, 1), (-2, 1), lambda cell: True)
+    assert len(path) == 3
+    assert path[-1] == (-2, 1)
+
+
+def test_find_path_like_shortest_path():
+    grid = HexGrid()
+    rng = random.Random(0)
+    f = HexPathFinder(100)
+    for i in xrange(50):
+        walls = set((rng.randint(-8, 8), rng.randint(-8, 8))
+                    for j in xrange(60))
+        start = rng.randint(-8, 8), rng.randint(-8, 8)
+        goal = rng.randint(-8, 8), rng.randint(-8, 8)
+        walls.discard(start)
+        passable = lambda cell: cell not in walls
+        expected = shortest_path(start, lambda cell: cell == goal,
+                                 lambda cell: filter(passable,
+                                                     grid.neighbors(cell)),
+                                 grid.neighbor_dist,
+                                 lambda cell: grid.cell_dist(cell, goal),
+                                 limit=100)
+        path = f.find_path(start, goal, passable, limit=100)
+        assert is_path(start, path, passable)
+        reached = bool(path) and path[-1] == goal
+        assert reached == (bool(expected) and expected[-1] == goal)
+        if reached:
+            assert len(path) == len(expected)
+
+
+def test():
+
+    print
+    print 'Running HexPathFinder test suite...'
+
+    print 'Testing HexPathFinder class...'
+    test_find_path_when_open()
+    test_find_path_when_start_is_goal()
+    test_find_path_around_wall()
+    test_blocked_cells()
+    test_find_path_when_unreachable()
+    test_find_path_beyond_radius()
+    test_find_path_reuse()
+    test_find_path_like_shortest_path()
+
+
+if __name__ == '__main__':
+    test()
@@ -27,6 +27,14 @@ from Screen import Screen
 
 TIME_STEP = 0.02
 
+# At most this many time steps are simulated between two frames. Any time
+# beyond that is dropped, so that the game slows down under load instead of
+# spending ever longer catching up.
+MAX_CATCH_UP_STEPS = 5
+
+MAX_FRAME_RATE = 60
+LAG_REPORT_INTERVAL = 1.0
+
 
 def main():
     game = Game()
@@ -35,16 +43,33 @@ def main():
 
     screen = Screen()
 
-    next_time = time.time()
+    # The simulation and the frames are paced separately. The time that
+    # was dropped since the last report is shown as the simulation lag.
+    next_time = next_frame_time = time.time()
+    next_report_time = next_time + LAG_REPORT_INTERVAL
+    lag = 0.0
     while True:
         current_time = time.time()
+        steps = 0
+        while next_time <= current_time and steps < MAX_CATCH_UP_STEPS:
+            next_time += TIME_STEP
+            game.update(TIME_STEP)
+            steps += 1
         if next_time <= current_time:
-            while next_time <= current_time:
-                next_time += TIME_STEP
-                game.update(TIME_STEP)
-            screen.update(game)
-        else:
-            time.sleep(next_time - current_time)
+            lag += current_time - next_time
+            next_time = current_time
+        if next_frame_time <= current_time:
+            alpha = 1 - (next_time - current_time) / TIME_STEP
+            screen.update(game, max(0.0, min(alpha, 1.0)))
+            next_frame_time = max(next_frame_time + 1.0 / MAX_FRAME_RATE,
+                                  current_time)
+        if next_report_time <= current_time:
+            screen.show_lag(lag)
+            lag = 0.0
+            next_report_time = current_time + LAG_REPORT_INTERVAL
+        delay = min(next_time, next_frame_time) - time.time()
+        if delay > 0:
+            time.sleep(delay)
 
 
 if __name__ == '__main__':
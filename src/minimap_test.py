@@ -0,0 +1,92 @@
+# Copyright (c) 2008 Mikael Lind
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+from config.units import Warrior
+from Game import Game
+from Minimap import Minimap
+
+
+def test_mapping():
+    game = Game(((0, 0), (40, 20)))
+    minimap = Minimap(game, (100, 100))
+    (min_x, min_y), (max_x, max_y) = minimap.extent()
+    x, y = minimap.to_minimap((min_x, max_y))
+    assert 0 < x < 50 and abs(y) < 1e-9
+    x, y = minimap.to_minimap((max_x, min_y))
+    assert abs(x + minimap.to_minimap((min_x, max_y))[0] - 100) < 1e-9
+    assert abs(y - 100) < 1e-9
+    x, y = minimap.to_world(minimap.to_minimap((12.5, 7.5)))
+    assert abs(x - 12.5) < 1e-9 and abs(y - 7.5) < 1e-9
+
+
+def test_occupancy():
+    game = Game(((0, 0), (40, 40)))
+    minimap = Minimap(game, (100, 100), 5)
+    a = Warrior('cyan')
+    b = Warrior('red')
+    game.add_unit(a, (10, 10))
+    game.add_unit(b, (30, 30))
+    cells = minimap.occupied_cells()
+    assert sorted(cells) == ['cyan', 'red']
+    assert len(cells['cyan']) == 1 and cells['cyan'] != cells['red']
+    minimap.changed = False
+    game.move_unit(b, (30, 31))
+    game.move_unit(b, (30, 30))
+    assert minimap.occupied_cells() == cells
+    game.move_unit(b, (10, 10))
+    assert minimap.changed
+    assert minimap.occupied_cells()['red'] == cells['cyan']
+    game.remove_unit(a)
+    game.remove_unit(b)
+    assert minimap.occupied_cells() == {}
+    minimap.close()
+    assert not game.listeners
+
+
+def test_extend():
+    game = Game()
+    game.add_unit(Warrior('cyan'), (0, 0))
+    minimap = Minimap(game, (100, 100), 5, 10.0)
+    version = minimap.version
+    unit = Warrior('red')
+    game.add_unit(unit, (100, 100))
+    assert minimap.version > version
+    (min_x, min_y), (max_x, max_y) = minimap.extent()
+    x, y = game.cell_to_point(unit.cell)
+    assert min_x <= x <= max_x and min_y <= y <= max_y
+    cells = minimap.occupied_cells()
+    assert len(cells['cyan']) == 1 and len(cells['red']) == 1
+
+
+def test():
+
+    print
+    print 'Running Minimap test suite...'
+
+    print 'Testing Minimap class...'
+    test_mapping()
+    test_occupancy()
+    test_extend()
+
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,104 @@
+# Copyright (c) 2008 Mikael Lind
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+"""Compare the generic shortest path search with the hex path finder."""
+
+
+from optparse import OptionParser
+import random, sys, time
+
+from HexGrid import HexGrid
+from HexPathFinder import HexPathFinder
+from shortest_path import shortest_path
+
+
+def create_queries(count, size, density, seed):
+    rng = random.Random(seed)
+    walls = set()
+    for m in xrange(-size, size + 1):
+        for n in xrange(-size, size + 1):
+            if rng.random() < density:
+                walls.add((m, n))
+    queries = []
+    while len(queries) < count:
+        start = rng.randint(-size, size), rng.randint(-size, size)
+        goal = rng.randint(-size, size), rng.randint(-size, size)
+        if start not in walls:
+            queries.append((start, goal))
+    return walls, queries
+
+
+def run_generic(grid, walls, queries, limit):
+    nodes = []
+    for start, goal in queries:
+        def neighbors(cell):
+            return [n for n in grid.neighbors(cell) if n not in walls]
+        def heuristic(cell):
+            return grid.cell_dist(cell, goal)
+        shortest_path(start, lambda cell: cell == goal, neighbors,
+                      grid.neighbor_dist, heuristic, limit=limit,
+                      debug=lambda seen: nodes.append(len(seen)))
+    return sum(nodes)
+
+
+def run_hex(grid, walls, queries, limit):
+    size = max(max(abs(m), abs(n)) for query in queries for m, n in query)
+    finder = HexPathFinder(min(limit, 2 * size + 1))
+    def passable(cell):
+        return cell not in walls
+    nodes = 0
+    for start, goal in queries:
+        finder.find_path(start, goal, passable, limit)
+        nodes += finder.nodes()
+    return nodes
+
+
+def main():
+    parser = OptionParser(usage='%prog [options]',
+                          description='Benchmark the path finders.')
+    parser.add_option('-q', '--queries', type='int', default=500,
+                      help='number of searches (default: %default)')
+    parser.add_option('-s', '--size', type='int', default=30,
+                      help='map radius in cells (default: %default)')
+    parser.add_option('-d', '--density', type='float', default=0.25,
+                      help='fraction of blocked cells (default: %default)')
+    parser.add_option('-l', '--limit', type='int', default=100,
+                      help='search limit in nodes (default: %default)')
+    options, args = parser.parse_args()
+    if args:
+        parser.print_help(sys.stderr)
+        sys.exit(1)
+
+    grid = HexGrid()
+    walls, queries = create_queries(options.queries, options.size,
+                                    options.density, 0)
+    for name, run in [('shortest_path', run_generic),
+                      ('HexPathFinder', run_hex)]:
+        start_time = time.time()
+        nodes = run(grid, walls, queries, options.limit)
+        wall_time = time.time() - start_time
+        sys.stdout.write('%-14s %8d nodes %8.3f s %10.0f nodes/sec\n'
+                         % (name, nodes, wall_time, nodes / wall_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+# Copyright (c) 2008 Mikael Lind
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+from HexPathFinder import HexPathFinder
+from PathCache import PathCache, RegionVersions
+
+
+def test_region():
+    v = RegionVersions(8)
+    assert v.region((0, 0)) == (0, 0)
+    assert v.region((7, 8)) == (0, 1)
+    assert v.region((-1, -8)) == (-1, -1)
+
+
+def test_stamp_when_unchanged():
+    v = RegionVersions(8)
+    stamp = v.stamp([(1, 2), (20, 3)])
+    v.bump([(50, 50)])
+    assert v.current(stamp)
+
+
+def test_stamp_when_changed():
+    v = RegionVersions(8)
+    stamp = v.stamp([(1, 2), (20, 3)])
+    v.bump([(17, 7)])
+    assert not v.current(stamp)
+
+
+def test_get_when_absent():
+    c = PathCache(RegionVersions())
+    assert c.get((0, 0), (3, 0), False) is None
+    assert c.misses == 1
+
+
+def test_get_when_present():
+    c = PathCache(RegionVersions())
+    c.put((0, 0), (2, 0), False, [(1, 0), (2, 0)], [(0, 0), (1, 0), (2, 0)])
+    assert c.get((0, 0), (2, 0), False) == ((1, 0), (2, 0))
+    assert c.get((0, 0), (2, 0), True) is None
+    assert c.hits == 1
+    assert c.misses == 1
+
+
+def test_get_when_invalidated():
+    v = RegionVersions()
+    c = PathCache(v)
+    c.put((0, 0), (2, 0), False, [(1, 0), (2, 0)], [(0, 0), (1, 0), (2, 0)])
+    v.bump([(1, 1)])
+    assert c.get((0, 0), (2, 0), False) is None
+    assert c.invalidations == 1
+    assert not c
+
+
+def test_get_when_not_valid():
+    c = PathCache(RegionVersions())
+    c.put((0, 0), (2, 0), False, [(1, 0), (2, 0)], [(0, 0), (1, 0), (2, 0)])
+    assert c.get((0, 0), (2, 0), False, lambda path: False) is None
+    assert c.invalidations == 1
+
+
+def test_eviction():
+    c = PathCache(RegionVersions(), capacity=2)
+    c.put((0, 0), (1, 0), False, [(1, 0)], [(0, 0)])
+    c.put((0, 0), (2, 0), False, [(2, 0)], [(0, 0)])
+    c.get((0, 0), (1, 0), False)
+    c.put((0, 0), (3, 0), False, [(3, 0)], [(0, 0)])
+    assert len(c) == 2
+    assert c.evictions == 1
+    assert c.get((0, 0), (2, 0), False) is None
+    assert c.get((0, 0), (1, 0), False) == ((1, 0),)
+
+
+def cache_path_around_wall(walls):
+    v = RegionVersions()
+    c = PathCache(v)
+    finder = HexPathFinder(20)
+    def passable(cell):
+        return cell not in walls
+    path = finder.find_path((0, 0), (4, 0), passable)
+    blocked = finder.blocked_cells()
+    c.put((0, 0), (4, 0), False, path, finder.cells() + blocked, blocked)
+    return v, c, path, blocked, passable
+
+
+def test_get_when_blocked_cell_unlocked():
+    walls = set((2, n) for n in xrange(-3, 4))
+    v, c, path, blocked, passable = cache_path_around_wall(walls)
+    assert not walls & set(path)
+    assert c.get((0, 0), (4, 0), False, passable=passable) == tuple(path)
+    cell = (2, 0)
+    assert cell in blocked and cell not in path
+    walls.remove(cell)
+    v.bump([cell])
+    assert c.get((0, 0), (4, 0), False, passable=passable) is None
+
+
+def test_get_when_blocked_cell_passable():
+    walls = set((2, n) for n in xrange(-3, 4))
+    v, c, path, blocked, passable = cache_path_around_wall(walls)
+    walls.remove((2, 0))
+    assert c.get((0, 0), (4, 0), False, passable=passable) is None
+    assert c.invalidations == 1
+
+
+def test():
+
+    print
+    print 'Running PathCache test suite...'
+
+    print 'Testing RegionVersions class...'
+    test_region()
+    test_stamp_when_unchanged()
+    test_stamp_when_changed()
+
+    print 'Testing PathCache class...'
+    test_get_when_absent()
+    test_get_when_present()
+    test_get_when_invalidated()
+    test_get_when_not_valid()
+    test_eviction()
+    test_get_when_blocked_cell_unlocked()
+    test_get_when_blocked_cell_passable()
+
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,93 @@
+# Copyright (c) 2008 Mikael Lind
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+from config.units import Tavern, Warrior
+from Game import Game
+from geometry import rect_from_center_and_size
+from PickingIndex import PickingIndex
+
+
+def sprite_rect(game):
+    def rect(unit):
+        x, y = game.cell_to_point(unit.cell)
+        return rect_from_center_and_size((x * 10, -y * 10), (20, 20))
+    return rect
+
+
+def test_pick_top_most():
+    game = Game()
+    index = PickingIndex(game, sprite_rect(game))
+    a = Warrior('cyan')
+    b = Warrior('cyan')
+    game.add_unit(a, (0, 0))
+    game.add_unit(b, (0, 1))
+    assert len(index) == 2
+    x, y = game.cell_to_point(a.cell)
+    bx, by = game.cell_to_point(b.cell)
+    point = (x + bx) * 5, -(y + by) * 5
+    top, bottom = (a, b) if y < by else (b, a)
+    assert index.pick(point) is top
+    assert index.pick((1000, 1000)) is None
+
+
+def test_follow_game():
+    game = Game()
+    index = PickingIndex(game, sprite_rect(game))
+    unit = Warrior('cyan')
+    game.add_unit(unit, (0, 0))
+    x, y = game.cell_to_point(unit.cell)
+    assert index.pick((x * 10, -y * 10)) is unit
+    game.move_unit(unit, (20, 0))
+    assert index.pick((x * 10, -y * 10)) is None
+    x, y = game.cell_to_point(unit.cell)
+    assert index.pick((x * 10, -y * 10)) is unit
+    game.remove_unit(unit)
+    assert len(index) == 0
+    index.close()
+    assert not game.listeners
+
+
+def test_select():
+    game = Game()
+    tavern = Tavern('cyan')
+    game.add_unit(tavern, (0, 0))
+    index = PickingIndex(game, sprite_rect(game))
+    x, y = game.cell_to_point(tavern.cell)
+    assert index.select(((x * 10 - 5, -y * 10 - 5),
+                         (x * 10 + 5, -y * 10 + 5))) == set([tavern])
+    assert index.select(((x * 10 + 10, -y * 10),
+                         (x * 10 + 20, -y * 10 + 5))) == set()
+
+
+def test():
+
+    print
+    print 'Running PickingIndex test suite...'
+
+    print 'Testing PickingIndex class...'
+    test_pick_top_most()
+    test_follow_game()
+    test_select()
+
+
+if __name__ == '__main__':
+    test()
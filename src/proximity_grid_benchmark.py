@@ -0,0 +1,103 @@
+# Copyright (c) 2008 Mikael Lind
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+"""Compare proximity grid queries with a scan over all entries."""
+
+
+from optparse import OptionParser
+import random, sys, time
+
+from ProximityGrid import box_dist, ProximityGrid
+
+
+def create_grid(entries, size, cell_size, seed):
+    rng = random.Random(seed)
+    grid = ProximityGrid(cell_size)
+    for i in xrange(entries):
+        x, y = rng.uniform(0, size), rng.uniform(0, size)
+        grid[i] = (x - 0.5, y - 0.5), (x + 0.5, y + 0.5)
+    return grid
+
+
+def create_points(count, size, seed):
+    rng = random.Random(seed)
+    return [(rng.uniform(0, size), rng.uniform(0, size))
+            for i in xrange(count)]
+
+
+def scan_nearest(grid, keys, point, k):
+    dists = sorted((box_dist(grid[key], point), key) for key in keys)
+    return [key for dist, key in dists[:k]]
+
+
+def scan_within_radius(grid, keys, point, radius):
+    return set(key for key in keys
+               if box_dist(grid[key], point) <= radius)
+
+
+def measure(name, query, points):
+    start_time = time.time()
+    for point in points:
+        query(point)
+    wall_time = time.time() - start_time
+    sys.stdout.write('%-24s %8.3f s %10.1f queries/sec\n'
+                     % (name, wall_time, len(points) / wall_time))
+
+
+def main():
+    parser = OptionParser(usage='%prog [options]',
+                          description='Benchmark proximity grid queries.')
+    parser.add_option('-e', '--entries', default='1000,10000',
+                      help='comma separated entry counts (default: %default)')
+    parser.add_option('-q', '--queries', type='int', default=200,
+                      help='number of queries (default: %default)')
+    parser.add_option('-k', '--nearest', type='int', default=5,
+                      help='entries per nearest query (default: %default)')
+    parser.add_option('-r', '--radius', type='float', default=5.0,
+                      help='radius of radius queries (default: %default)')
+    parser.add_option('-c', '--cell-size', type='float', default=5.0,
+                      help='grid cell size (default: %default)')
+    options, args = parser.parse_args()
+    if args:
+        parser.print_help(sys.stderr)
+        sys.exit(1)
+
+    for entries in [int(value) for value in options.entries.split(',')]:
+        # Keep the density constant, with about one entry per 4 x 4 area.
+        size = 4 * entries ** 0.5
+        grid = create_grid(entries, size, options.cell_size, 0)
+        keys = range(entries)
+        points = create_points(options.queries, size, 1)
+        k, radius = options.nearest, options.radius
+        sys.stdout.write('%d entries:\n' % entries)
+        measure('  nearest', lambda p: grid.nearest(p, k), points)
+        measure('  nearest (scan)', lambda p: scan_nearest(grid, keys, p, k),
+                points)
+        measure('  within_radius', lambda p: grid.within_radius(p, radius),
+                points)
+        measure('  within_radius (scan)',
+                lambda p: scan_within_radius(grid, keys, p, radius),
+                points)
+
+
+if __name__ == '__main__':
+    main()
@@ -19,7 +19,7 @@
 # SOFTWARE.
 
 
-from ProximityGrid import intersects, ProximityGrid
+from ProximityGrid import box_dist, intersects, ProximityGrid
 
 
 def test_intersects_when_equal():
@@ -48,6 +48,13 @@ def test_intersects_when_disjoint():
     assert not intersects(b, a)
 
 
+def test_box_dist():
+    a = ((1, 2), (3, 4))
+    assert box_dist(a, (2, 3)) == 0
+    assert box_dist(a, (5, 3)) == 2
+    assert box_dist(a, (-2, -2)) == 5
+
+
 def test_getitem_when_absent():
     g = ProximityGrid()
     try:
@@ -77,6 +84,22 @@ def test_setitem_when_present():
     assert g['a'] == ((5, 6), (7, 8))
 
 
+def test_update():
+    for g in ProximityGrid(), ProximityGrid(2, ((0, 0), (10, 10))):
+        g['a'] = ((1, 2), (3, 4))
+        g['b'] = ((5, 6), (7, 8))
+        del g['b']
+        g.update([('c', ((8, 8), (11, 12))), ('a', ((5, 6), (7, 8))),
+                  ('d', ((1, 2), (3, 4))), ('e', ((2, 3), (4, 5))),
+                  ('e', ((8, 9), (9, 10)))])
+        assert len(g) == 4
+        assert g['a'] == ((5, 6), (7, 8))
+        assert g['e'] == ((8, 9), (9, 10))
+        assert g.intersect(((2, 3), (2, 3))) == set(['d'])
+        assert g.intersect(((6, 7), (9, 10))) == set(['a', 'c', 'e'])
+        assert sorted(g.intersect_many([((2, 3), (2, 3))])) == [(0, 'd')]
+
+
 def test_delitem_when_absent():
     g = ProximityGrid()
     try:
@@ -143,6 +166,93 @@ def test_intersect():
     assert(g.intersect(((2, 3), (6, 7))) == set(['a', 'b']))
 
 
+def test_intersect_many():
+    g = ProximityGrid()
+    g['a'] = ((1, 2), (3, 4))
+    g['b'] = ((5, 6), (7, 8))
+    g['c'] = ((9, 10), (11, 12))
+    del g['c']
+    rects = [((1, 5), (2, 6)), ((2, 3), (2, 3)), ((2, 3), (6, 7))]
+    assert sorted(g.intersect_many(rects)) == [(1, 'a'), (2, 'a'), (2, 'b')]
+    assert g.intersect_many([]) == []
+
+
+def test_dense_bounds():
+    g = ProximityGrid(2, ((0, 0), (10, 10)))
+    assert g.bounds() == ((0, 0), (10, 10))
+    assert ProximityGrid().bounds() is None
+
+
+def test_dense_intersect():
+    g = ProximityGrid(2, ((0, 0), (10, 10)))
+    g['a'] = ((1, 2), (3, 4))
+    g['b'] = ((5, 6), (7, 8))
+    g['c'] = ((-5, -5), (-3, -3))
+    assert g.intersect(((2, 3), (6, 7))) == set(['a', 'b'])
+    assert g.intersect(((-4, -4), (-4, -4))) == set(['c'])
+    g['a'] = ((12, 12), (13, 13))
+    assert g.intersect(((2, 3), (6, 7))) == set(['b'])
+    del g['b']
+    assert g.intersect_many([((2, 3), (6, 7)), ((11, 11), (20, 20))]) == \
+        [(1, 'a')]
+
+
+def test_nearest():
+    g = ProximityGrid(2)
+    assert g.nearest((0, 0)) == []
+    g['a'] = ((1, 1), (2, 2))
+    g['b'] = ((-5, 3), (-4, 4))
+    g['c'] = ((20, 20), (21, 21))
+    assert g.nearest((0, 0)) == ['a']
+    assert g.nearest((0, 0), 2) == ['a', 'b']
+    assert g.nearest((0, 0), 5) == ['a', 'b', 'c']
+    assert g.nearest((0, 0), 0) == []
+    assert g.nearest((30, 30)) == ['c']
+    assert g.nearest((0, 0), filter=lambda key: key != 'a') == ['b']
+    assert g.nearest((0, 0), 3, max_dist=10) == ['a', 'b']
+
+
+def test_within_radius():
+    g = ProximityGrid(2)
+    g['a'] = ((1, 1), (2, 2))
+    g['b'] = ((-5, 3), (-4, 4))
+    g['c'] = ((20, 20), (21, 21))
+    assert g.within_radius((0, 0), 1) == set()
+    assert g.within_radius((0, 0), 2) == set(['a'])
+    assert g.within_radius((0, 0), 5) == set(['a', 'b'])
+    assert g.within_radius((0, 0), 5, lambda key: key != 'b') == set(['a'])
+    del g['a']
+    assert g.within_radius((0, 0), 5) == set(['b'])
+
+
+def test_dense_nearest():
+    g = ProximityGrid(2, ((0, 0), (10, 10)))
+    g['a'] = ((1, 1), (2, 2))
+    g['b'] = ((8, 8), (9, 9))
+    g['c'] = ((30, 30), (31, 31))
+    assert g.nearest((3, 3), 2) == ['a', 'b']
+    assert g.nearest((29, 29)) == ['c']
+    assert g.within_radius((32, 32), 2) == set(['c'])
+    assert g.within_radius((5, 5), 6) == set(['a', 'b'])
+
+
+def test_nearest_many():
+    for g in ProximityGrid(2), ProximityGrid(2, ((0, 0), (10, 10))):
+        g['a'] = ((1, 1), (2, 2))
+        g['b'] = ((8, 8), (9, 9))
+        g['c'] = ((4, 1), (5, 2))
+        points = [(3.2, 1.5), (3.2, 1.5), (10, 9), (6, 6), (6, 1.5), (3, 1.5)]
+        max_dists = [2, 2, 1, 1, 1, 2]
+        def filter(i, key):
+            return i != 1 or key != 'c'
+        assert g.nearest_many(points, max_dists, filter) == \
+            ['c', 'a', 'b', None, 'c', 'a']
+        for point, max_dist in zip(points, max_dists):
+            assert (g.nearest_many([point], [max_dist])
+                    == (g.nearest(point, 1, max_dist=max_dist) or [None]))
+        assert g.nearest_many([], []) == []
+
+
 def test():
 
     print
@@ -153,12 +263,14 @@ def test():
     test_intersects_when_overlap()
     test_intersects_when_contained()
     test_intersects_when_disjoint()
+    test_box_dist()
     
     print 'Testing Grid class...'
     test_getitem_when_absent()
     test_getitem_when_present()
     test_setitem_when_absent()
     test_setitem_when_present()
+    test_update()
     test_delitem_when_absent()
     test_delitem_when_present()
     test_contains_when_absent()
@@ -168,6 +280,13 @@ def test():
     test_default_cell_size()
     test_cell_size()
     test_intersect()
+    test_intersect_many()
+    test_dense_bounds()
+    test_dense_intersect()
+    test_nearest()
+    test_within_radius()
+    test_dense_nearest()
+    test_nearest_many()
 
 
 if __name__ == '__main__':
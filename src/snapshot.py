@@ -0,0 +1,404 @@
+# Copyright (c) 2008 Mikael Lind
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+"""Compact binary snapshots of game state.
+
+A snapshot is a header followed by sections of fixed-size little-endian
+records: a string table, the units, their cell locks, their tasks, the
+cells of task paths, the idle scan queue and the state of the random
+number generator. Snapshots are read through a memory map, one section at
+a time, without any parsing beyond unpacking the records.
+
+Caches and incremental planners, such as the D* Lite planners of
+replanning units, are not saved. A restored game plans from scratch, so
+it only runs exactly like the original game if that one drops the same
+state with Game.clear_caches when the snapshot is written.
+"""
+
+
+from array import array
+import mmap, struct, sys
+
+import config.tasks, config.units
+
+
+MAGIC = 'HXSN'
+VERSION = 1
+
+HEADER = struct.Struct('<4sH' 'ddq' 'B4i' 'qdd' 'didi' 'id' '7i')
+UNIT = struct.Struct('<hhBiidBiii')
+TASK = struct.Struct('<hh' 'BiiBii' 'ddd' '4i' 'ih' 'i' 'di' 'dih')
+IDLE = struct.Struct('<di')
+
+NONE = float('nan')
+
+# The attributes that are saved for every type of task, as the argument of
+# its constructor, cells, floats, integers, a unit, a class and a path.
+TASK_FIELDS = {
+    'Move': ('goal', ('goal',), (), ('flow', 'replan', 'stuck', 'waits'),
+             None, None, 'path'),
+    'Step': ('dest', ('dest', 'origin'),
+             ('dist', 'step_time', 'departure_time'), (), None, None, None),
+    'Produce': ('product_class', (), (), (), None, 'product_class', None),
+    'Build': ('building_class', (), (), (), None, 'building_class', None),
+    'Attack': ('target', (), (), (), 'target', None, None),
+    'Hit': ('target', (), (), (), 'target', None, None),
+}
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def write_snapshot(path, state):
+
+    """Write a game state to a file.
+
+    The state is a dictionary as returned by read_snapshot. Every unit
+    refers to its tasks, and the scheduled tasks, path requests and idle
+    units are given in queue order.
+    """
+
+    strings = _StringTable()
+    units = state['units']
+    unit_indices = dict((unit, i) for i, unit in enumerate(units))
+    schedule = dict((task, (time, i))
+                    for i, (time, task) in enumerate(state['scheduled']))
+    requests = dict((task, (time, i, _method_name(task, set_path)))
+                    for i, (time, task, set_path)
+                    in enumerate(state['requests']))
+    owner = state['owner']
+
+    unit_data, lock_data, task_data = [], array('i'), []
+    path_data = array('i')
+    for unit in units:
+        has_cell = unit.cell is not None
+        m, n = unit.cell if has_cell else (0, 0)
+        unit_data.append(UNIT.pack(
+            strings.index(type(unit).__name__), strings.index(unit.color),
+            has_cell, m, n, unit.health, unit.moving,
+            len(unit.cell_locks), len(unit.task_stack),
+            len(unit.task_queue)))
+        for cell in sorted(unit.cell_locks):
+            lock_data.extend((cell[0], cell[1], owner(cell) is unit))
+        for task in list(unit.task_stack) + list(unit.task_queue):
+            task_data.append(_pack_task(task, strings, unit_indices,
+                                        schedule, requests, path_data))
+
+    idle_data = [IDLE.pack(due, unit_indices[unit])
+                 for due, unit in state['idle']]
+    random_version, random_ints, gauss_next = state['random_state']
+    random_data = array('I', random_ints)
+    string_data = strings.data()
+
+    bounds = state['bounds']
+    (min_m, min_n), (max_m, max_n) = bounds or ((0, 0), (0, 0))
+    stats = state['path_stats']
+    header = HEADER.pack(
+        MAGIC, VERSION,
+        state['time'], _float(state['time_step']), state['skipped_ticks'],
+        bounds is not None, min_m, min_n, max_m, max_n,
+        stats.served, stats.total_latency, stats.max_latency,
+        _float(state['path_time_budget']), _int(state['path_node_budget']),
+        state['idle_scan_interval'], _int(state['idle_scan_budget']),
+        random_version, _float(gauss_next),
+        len(string_data), len(unit_data), len(lock_data) // 3,
+        len(task_data), len(path_data) // 2, len(idle_data),
+        len(random_data))
+
+    with open(path, 'wb') as f:
+        f.write(header)
+        f.write(string_data)
+        f.write(''.join(unit_data))
+        f.write(_array_data(lock_data))
+        f.write(''.join(task_data))
+        f.write(_array_data(path_data))
+        f.write(''.join(idle_data))
+        f.write(_array_data(random_data))
+
+
+def read_snapshot(path):
+
+    """Read a game state from a file written by write_snapshot.
+
+    Return a dictionary with the header fields, the units with their tasks,
+    and the scheduled tasks, path requests and idle units in queue order.
+    The tasks on the unit stacks still need to be initialized. The locks
+    owned by each unit are returned as a dictionary from unit to cells.
+    """
+
+    with open(path, 'rb') as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        return _read(buf)
+    finally:
+        buf.close()
+
+
+def _read(buf):
+    if buf[:len(MAGIC)] != MAGIC:
+        raise SnapshotError('not a snapshot')
+    (magic, version, time, time_step, skipped_ticks,
+     has_bounds, min_m, min_n, max_m, max_n,
+     served, total_latency, max_latency,
+     path_time_budget, path_node_budget,
+     idle_scan_interval, idle_scan_budget,
+     random_version, gauss_next,
+     string_size, unit_count, lock_count, task_count, cell_count,
+     idle_count, random_count) = HEADER.unpack_from(buf)
+    if version != VERSION:
+        raise SnapshotError('unsupported snapshot version %d' % version)
+    offset = HEADER.size
+
+    strings = buf[offset:offset + string_size].split('\n')
+    offset += string_size
+
+    unit_records = _unpack_records(UNIT, buf, offset, unit_count)
+    offset += UNIT.size * unit_count
+    units = []
+    for (type_index, color_index, has_cell, m, n, health,
+         moving) in [record[:7] for record in unit_records]:
+        unit = getattr(config.units, strings[type_index])(
+            strings[color_index])
+        unit.cell = (m, n) if has_cell else None
+        unit.health = health
+        unit.moving = bool(moving)
+        units.append(unit)
+
+    locks = _read_array('i', buf, offset, 3 * lock_count)
+    offset += 3 * locks.itemsize * lock_count
+    task_records = _unpack_records(TASK, buf, offset, task_count)
+    offset += TASK.size * task_count
+    cells = _read_array('i', buf, offset, 2 * cell_count)
+    offset += 2 * cells.itemsize * cell_count
+    idle = [(due, units[unit_index]) for due, unit_index
+            in _unpack_records(IDLE, buf, offset, idle_count)]
+    offset += IDLE.size * idle_count
+    random_ints = _read_array('I', buf, offset, random_count)
+
+    owned = {}
+    scheduled, requests = [], []
+    lock_index = task_index = cell_index = 0
+    for unit, record in zip(units, unit_records):
+        unit_locks, stack_count, queue_count = record[7:]
+        owned[unit] = []
+        for i in xrange(lock_index, lock_index + unit_locks):
+            cell = locks[3 * i], locks[3 * i + 1]
+            unit.cell_locks.add(cell)
+            if locks[3 * i + 2]:
+                owned[unit].append(cell)
+        lock_index += unit_locks
+        for i in xrange(stack_count + queue_count):
+            task, cell_index = _unpack_task(task_records[task_index],
+                                            strings, units, cells,
+                                            cell_index, scheduled, requests)
+            task_index += 1
+            if i < stack_count:
+                unit.task_stack.append(task)
+            else:
+                unit.task_queue.append(task)
+    scheduled.sort()
+    requests.sort()
+
+    return {
+        'time': time,
+        'time_step': _none(time_step),
+        'skipped_ticks': skipped_ticks,
+        'bounds': (((min_m, min_n), (max_m, max_n)) if has_bounds
+                   else None),
+        'path_stats': (served, total_latency, max_latency),
+        'path_time_budget': _none(path_time_budget),
+        'path_node_budget': path_node_budget if path_node_budget >= 0
+                            else None,
+        'idle_scan_interval': idle_scan_interval,
+        'idle_scan_budget': idle_scan_budget if idle_scan_budget >= 0
+                            else None,
+        'random_state': (random_version, tuple(random_ints),
+                         _none(gauss_next)),
+        'units': units,
+        'owned': owned,
+        'scheduled': [(time, task) for order, time, task in scheduled],
+        'requests': [(time, task, set_path)
+                     for order, time, task, set_path in requests],
+        'idle': idle,
+    }
+
+
+def _pack_task(task, strings, unit_indices, schedule, requests, path_data):
+    name = type(task).__name__
+    fields = TASK_FIELDS.get(name)
+    if fields is None:
+        raise SnapshotError('cannot save task %s' % name)
+    arg, cell_names, float_names, int_names, unit_name, class_name, \
+        path_name = fields
+
+    cells = [getattr(task, cell_name) for cell_name in cell_names]
+    cells += [None] * (2 - len(cells))
+    cell_values = []
+    for cell in cells:
+        cell_values.extend((False, 0, 0) if cell is None
+                           else (True, cell[0], cell[1]))
+    floats = [_float(getattr(task, float_name))
+              for float_name in float_names]
+    floats += [NONE] * (3 - len(floats))
+    ints = [int(getattr(task, int_name)) for int_name in int_names]
+    ints += [0] * (4 - len(ints))
+    unit_index = -1
+    if unit_name is not None:
+        unit_index = unit_indices.get(getattr(task, unit_name), -1)
+    class_index = -1
+    if class_name is not None:
+        class_index = strings.index(getattr(task, class_name).__name__)
+    path_count = 0
+    if path_name is not None:
+        path = getattr(task, path_name)
+        for cell in path:
+            path_data.extend(cell)
+        path_count = len(path)
+
+    phase = -1
+    if 'update' in task.__dict__:
+        phase = strings.index(_method_name(task, task.update))
+    scheduled_time, schedule_order = schedule.get(task, (NONE, -1))
+    request_time, request_order, set_path = requests.get(task,
+                                                         (NONE, -1, None))
+    return TASK.pack(strings.index(name), phase, *(
+        cell_values + floats + ints
+        + [unit_index, class_index, path_count,
+           scheduled_time, schedule_order, request_time, request_order,
+           -1 if set_path is None else strings.index(set_path)]))
+
+
+def _unpack_task(record, strings, units, cells, cell_index, scheduled,
+                 requests):
+    name = strings[record[0]]
+    fields = TASK_FIELDS.get(name)
+    if fields is None:
+        raise SnapshotError('cannot load task %s' % name)
+    arg, cell_names, float_names, int_names, unit_name, class_name, \
+        path_name = fields
+    phase = record[1]
+    cell_values = record[2:8]
+    floats = record[8:11]
+    ints = record[11:15]
+    (unit_index, class_index, path_count, scheduled_time, schedule_order,
+     request_time, request_order, set_path) = record[15:]
+
+    values = {}
+    for i, cell_name in enumerate(cell_names):
+        has_cell, m, n = cell_values[3 * i:3 * i + 3]
+        values[cell_name] = (m, n) if has_cell else None
+    for float_name, value in zip(float_names, floats):
+        values[float_name] = _none(value)
+    if unit_name is not None:
+        values[unit_name] = units[unit_index] if unit_index >= 0 else None
+    if class_name is not None:
+        values[class_name] = getattr(config.units, strings[class_index])
+
+    task = getattr(config.tasks, name)(values[arg])
+    for attr, value in values.iteritems():
+        setattr(task, attr, value)
+    for int_name, value in zip(int_names, ints):
+        setattr(task, int_name, type(getattr(task, int_name))(value))
+    if path_name is not None:
+        path = getattr(task, path_name)
+        for i in xrange(cell_index, cell_index + path_count):
+            path.append((cells[2 * i], cells[2 * i + 1]))
+        cell_index += path_count
+    if phase >= 0:
+        task.update = getattr(task, strings[phase])
+    if schedule_order >= 0:
+        scheduled.append((schedule_order, scheduled_time, task))
+    if request_order >= 0:
+        requests.append((request_order, request_time, task,
+                         getattr(task, strings[set_path])))
+    return task, cell_index
+
+
+def _array_data(values):
+
+    # Arrays are written in little-endian order, like the records.
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tostring()
+
+
+def _read_array(typecode, buf, offset, count):
+    values = array(typecode)
+    values.fromstring(buf[offset:offset + values.itemsize * count])
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+def _unpack_records(record, buf, offset, count):
+
+    # Unpack consecutive records with a single call, which is much faster
+    # than unpacking them one at a time.
+    if not count:
+        return []
+    fields = struct.unpack_from(record.format[0] + record.format[1:] * count,
+                                buf, offset)
+    size = len(fields) // count
+    return [fields[i:i + size] for i in xrange(0, len(fields), size)]
+
+
+def _method_name(obj, method):
+
+    # Return the attribute name of a bound method, which is mangled if the
+    # method name is private to the class that defines it.
+    name = method.__name__
+    if name.startswith('__') and not name.endswith('__'):
+        for cls in type(obj).__mro__:
+            mangled = '_%s%s' % (cls.__name__, name)
+            if cls.__dict__.get(mangled) is method.im_func:
+                return mangled
+    return name
+
+
+def _float(value):
+    return NONE if value is None else value
+
+
+def _int(value):
+    return -1 if value is None else value
+
+
+def _none(value):
+    return None if value != value else value
+
+
+class _StringTable(object):
+    def __init__(self):
+        self.__strings = []
+        self.__indices = {}
+
+    def index(self, string):
+        index = self.__indices.get(string)
+        if index is None:
+            index = self.__indices[string] = len(self.__strings)
+            self.__strings.append(string)
+        return index
+
+    def data(self):
+        return '\n'.join(self.__strings)
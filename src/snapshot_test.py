@@ -0,0 +1,95 @@
+# Copyright (c) 2008 Mikael Lind
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+from array import array
+import os, struct, tempfile
+
+from Game import Game
+from headless import create_game
+from snapshot import _array_data, _read_array
+
+
+TIME_STEP = 0.05
+
+
+def snapshot_and_restore(game):
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        game.snapshot(path)
+        return Game.restore(path)
+    finally:
+        os.remove(path)
+
+
+def create_games():
+    for dense in (False, True):
+        for orders in ('attack', 'move', 'flow', 'replan'):
+            game = create_game(1, 8, 2, orders, spread=10.0, dense=dense)
+            game.path_time_budget = None
+            yield game
+
+
+def test_round_trip():
+    for game in create_games():
+        for i in xrange(40):
+            game.update(TIME_STEP)
+        restored = snapshot_and_restore(game)
+        assert restored.state_hash() == game.state_hash()
+        assert restored.time == game.time
+        assert len(restored.units) == len(game.units)
+        assert restored.bounds == game.bounds
+
+
+def test_restored_game_runs_like_original():
+    for game in create_games():
+        for i in xrange(20):
+            game.update(TIME_STEP)
+        restored = snapshot_and_restore(game)
+        game.clear_caches()
+        for i in xrange(100):
+            game.update(TIME_STEP)
+            restored.update(TIME_STEP)
+            assert restored.state_hash() == game.state_hash()
+
+
+def test_arrays_are_little_endian():
+    values = array('i', [1, -2, 3 << 20])
+    data = _array_data(values)
+    assert data == struct.pack('<3i', 1, -2, 3 << 20)
+    assert _read_array('i', 'xx' + data, 2, 3) == values
+    assert _array_data(array('I', [7])) == struct.pack('<I', 7)
+
+
+def test():
+
+    print
+    print 'Running snapshot test suite...'
+
+    print 'Testing snapshot functions...'
+    test_arrays_are_little_endian()
+    test_round_trip()
+    test_restored_game_runs_like_original()
+
+
+if __name__ == '__main__':
+    test()
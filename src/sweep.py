@@ -0,0 +1,238 @@
+# Copyright (c) 2008 Mikael Lind
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+"""Run many headless matches in parallel for balance sweeps.
+
+Every combination of the given parameter values is played with each seed,
+one match per worker process, and a JSON line with the outcome of each match
+is written as soon as it finishes. Path requests are served without a time
+budget, so the outcome of a match does not depend on the load of the
+machine.
+"""
+
+
+from itertools import product
+from multiprocessing import Pool, cpu_count
+from optparse import OptionParser, OptionValueError
+import inspect, json, signal, sys, time
+
+from config import balance, units
+from config.tasks import Attack
+import headless
+from Unit import Unit
+
+
+STATS = 'speed', 'damage', 'min_range', 'max_range', 'attack_time', \
+        'max_health'
+
+
+def unit_class(name):
+    cls = getattr(units, name, None)
+    if not (inspect.isclass(cls) and issubclass(cls, Unit)):
+        raise ValueError('unknown unit type: %s' % name)
+    return cls
+
+
+def parse_param(option, opt_str, value, parser):
+
+    """Parse a parameter and its values for the grid.
+
+    The parameter is either a unit stat, such as Knight.damage, or the
+    damage factor of one unit type against another, such as Knight/Ranger.
+    """
+
+    try:
+        name, values = value.split('=', 1)
+        if '/' in name:
+            attacker, defender = name.split('/')
+            unit_class(attacker), unit_class(defender)
+        else:
+            cls_name, stat = name.split('.')
+            unit_class(cls_name)
+            if stat not in STATS:
+                raise ValueError('unknown stat: %s' % stat)
+        values = [float(v) for v in values.split(',')]
+    except ValueError, e:
+        raise OptionValueError('%s: %s' % (opt_str, e))
+    parser.values.params.append((name, values))
+
+
+def scenarios(params, seeds):
+
+    """Generate a scenario for every combination of values and seed."""
+
+    names = [name for name, values in params]
+    for values in product(*[values for name, values in params]):
+        for seed in seeds:
+            yield zip(names, values), seed
+
+
+def apply_params(params):
+
+    """Set the given parameters and return the values they replaced."""
+
+    old_params = []
+    for name, value in params:
+        if '/' in name:
+            key = tuple(unit_class(n) for n in name.split('/'))
+            old_params.append((name, balance.damage_factors.get(key)))
+            if value is None:
+                balance.damage_factors.pop(key, None)
+            else:
+                balance.damage_factors[key] = value
+        else:
+            cls_name, stat = name.split('.')
+            cls = unit_class(cls_name)
+            old_params.append((name, cls.__dict__.get(stat)))
+            if value is None:
+                delattr(cls, stat)
+            else:
+                setattr(cls, stat, value)
+    return old_params
+
+
+def play(game, max_ticks, time_step=headless.TIME_STEP):
+
+    """Step the game until at most one force has fighting units left.
+
+    Units only attack enemies near them on their own, so whenever every
+    unit is idle, the fighting units are sent after a random enemy. Return
+    the number of ticks, including skipped ones.
+    """
+
+    ticks = 0
+    while ticks < max_ticks and len(fighting_forces(game)) > 1:
+        if not game.task_queue:
+            send_idle_units(game)
+        ticks += game.fast_forward(time_step, max_ticks - ticks)
+        if ticks < max_ticks:
+            game.update(time_step)
+            ticks += 1
+    return ticks
+
+
+def send_idle_units(game):
+    units = sorted(game.units, key=lambda unit: unit.cell)
+    for unit in units:
+        if unit.damage is not None and not unit.task_stack:
+            enemies = [u for u in units if u.color != unit.color]
+            game.add_task(unit, Attack(game.random.choice(enemies)))
+
+
+def fighting_forces(game):
+    return set(unit.color for unit in game.units if unit.damage is not None)
+
+
+def run_match(scenario):
+
+    """Play one scenario and return its outcome as a dictionary."""
+
+    params, seed, match = scenario
+    old_params = apply_params(params)
+    try:
+        start_time = time.time()
+        game = headless.create_game(match['taverns'], match['heroes'],
+                                    match['forces'], 'attack',
+                                    spread=match['spread'], seed=seed)
+        game.path_time_budget = None
+        ticks = play(game, match['ticks'])
+        wall_time = time.time() - start_time
+    finally:
+        apply_params(reversed(old_params))
+    forces = fighting_forces(game)
+    survivors = {}
+    for unit in game.units:
+        survivors[unit.color] = survivors.get(unit.color, 0) + 1
+    return {'params': dict(params), 'seed': seed,
+            'winner': forces.pop() if len(forces) == 1 else None,
+            'duration': game.time, 'ticks': ticks, 'survivors': survivors,
+            'ticks_per_sec': ticks / wall_time if wall_time else 0.0}
+
+
+def ignore_interrupts():
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def main():
+    parser = OptionParser(usage='%prog [options]',
+                          description='Run a balance sweep of headless '
+                                      'matches on all cores.')
+    parser.add_option('-p', '--param', action='callback', type='string',
+                      callback=parse_param, dest='params', default=[],
+                      metavar='NAME=V1,V2,...',
+                      help='values of a unit stat, such as Knight.damage, '
+                           'or of a damage factor, such as Knight/Ranger; '
+                           'may be given more than once')
+    parser.add_option('-r', '--repeat', type='int', default=1,
+                      help='seeds per combination (default: %default)')
+    parser.add_option('-s', '--seed', type='int', default=0,
+                      help='first seed (default: %default)')
+    parser.add_option('-t', '--taverns', type='int', default=0,
+                      help='taverns per force (default: %default)')
+    parser.add_option('-u', '--heroes', type='int', default=10,
+                      help='heroes per force (default: %default)')
+    parser.add_option('-f', '--forces', type='int', default=2,
+                      help='number of forces, at most 4 (default: %default)')
+    parser.add_option('-n', '--ticks', type='int', default=15000,
+                      help='tick limit per match (default: %default)')
+    parser.add_option('-j', '--jobs', type='int', default=cpu_count(),
+                      help='worker processes (default: %default)')
+    parser.add_option('-w', '--output', default='-',
+                      help='JSON lines file, or - for standard output '
+                           '(default: %default)')
+    options, args = parser.parse_args()
+    if (args or not 2 <= options.forces <= len(headless.COLORS)
+        or options.repeat < 1 or options.jobs < 1):
+        parser.print_help(sys.stderr)
+        sys.exit(1)
+
+    match = dict(taverns=options.taverns, heroes=options.heroes,
+                 forces=options.forces, spread=20.0, ticks=options.ticks)
+    seeds = range(options.seed, options.seed + options.repeat)
+    jobs = [(params, seed, match)
+            for params, seed in scenarios(options.params, seeds)]
+    out = sys.stdout if options.output == '-' else open(options.output, 'w')
+    pool = Pool(options.jobs, ignore_interrupts)
+    start_time = time.time()
+    try:
+        for result in pool.imap_unordered(run_match, jobs):
+            out.write(json.dumps(result, sort_keys=True) + '\n')
+            out.flush()
+        pool.close()
+    except KeyboardInterrupt:
+        pool.terminate()
+        sys.exit(1)
+    except:
+        # The pool must be stopped before joining it, or the join hides
+        # the error, such as one raised by a match in a worker.
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+        if out is not sys.stdout:
+            out.close()
+    sys.stderr.write('%d matches in %.1f s\n'
+                     % (len(jobs), time.time() - start_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+# Copyright (c) 2008 Mikael Lind
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+"""Compare a binary heap with the calendar task queue."""
+
+
+from heapq import heappop, heappush
+from optparse import OptionParser
+import random, sys, time
+
+from TaskQueue import TaskQueue
+
+
+TIME_STEP = 0.02
+
+
+class Event(object):
+    pass
+
+
+def run_heap(events, ticks, max_delay, seed):
+    rng = random.Random(seed)
+    queue = []
+    for i in xrange(events):
+        heappush(queue, (rng.uniform(0, max_delay), Event()))
+    now = 0.0
+    popped = 0
+    for i in xrange(ticks):
+        now += TIME_STEP
+        while queue and queue[0][0] <= now:
+            event = heappop(queue)[-1]
+            heappush(queue, (now + rng.uniform(0, max_delay), event))
+            popped += 1
+    return popped
+
+
+def run_calendar(events, ticks, max_delay, seed):
+    rng = random.Random(seed)
+    queue = TaskQueue()
+    for i in xrange(events):
+        queue.push(rng.uniform(0, max_delay), Event())
+    now = 0.0
+    popped = 0
+    for i in xrange(ticks):
+        now += TIME_STEP
+        for event in queue.pop_due(now):
+            queue.push(now + rng.uniform(0, max_delay), event)
+            popped += 1
+    return popped
+
+
+def main():
+    parser = OptionParser(usage='%prog [options]',
+                          description='Benchmark the task queues.')
+    parser.add_option('-e', '--events', type='int', default=100000,
+                      help='number of pending events (default: %default)')
+    parser.add_option('-n', '--ticks', type='int', default=500,
+                      help='number of ticks to run (default: %default)')
+    parser.add_option('-d', '--max-delay', type='float', default=5.0,
+                      help='longest delay in seconds (default: %default)')
+    options, args = parser.parse_args()
+    if args:
+        parser.print_help(sys.stderr)
+        sys.exit(1)
+
+    for name, run in [('heap', run_heap), ('TaskQueue', run_calendar)]:
+        start_time = time.time()
+        popped = run(options.events, options.ticks, options.max_delay, 0)
+        wall_time = time.time() - start_time
+        sys.stdout.write('%-10s %8d events %8.3f s %10.0f events/sec\n'
+                         % (name, popped, wall_time, popped / wall_time))
+
+
+if __name__ == '__main__':
+    main()
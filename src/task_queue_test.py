@@ -0,0 +1,169 @@
+# Copyright (c) 2008 Mikael Lind
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+from TaskQueue import COMPACT_MIN_DEAD, TaskQueue
+
+
+def test_pop_due_in_time_order():
+    q = TaskQueue(0.1)
+    q.push(0.35, 'c')
+    q.push(0.05, 'a')
+    q.push(0.15, 'b')
+    assert list(q.pop_due(0.2)) == ['a', 'b']
+    assert list(q.pop_due(0.3)) == []
+    assert list(q.pop_due(0.4)) == ['c']
+    assert not q
+
+
+def test_pop_due_in_push_order_within_slot():
+    q = TaskQueue(0.1)
+    q.push(0.18, 'a')
+    q.push(0.11, 'b')
+    q.push(0.15, 'c')
+    assert list(q.pop_due(0.2)) == ['a', 'b', 'c']
+
+
+def test_pop_due_within_current_slot():
+    q = TaskQueue(0.1)
+    q.push(0.18, 'a')
+    q.push(0.11, 'b')
+    assert list(q.pop_due(0.15)) == ['b']
+    assert len(q) == 1
+    assert list(q.pop_due(0.18)) == ['a']
+
+
+def test_push_while_popping():
+    q = TaskQueue(0.1)
+    q.push(0.0, 'a')
+    result = []
+    for item in q.pop_due(0.05):
+        result.append(item)
+        if item == 'a':
+            q.push(0.05, 'b')
+            q.push(0.5, 'c')
+    assert result == ['a', 'b']
+    assert len(q) == 1
+
+
+def test_push_before_current_slot():
+    q = TaskQueue(0.1)
+    assert list(q.pop_due(1.0)) == []
+    q.push(0.5, 'a')
+    assert list(q.pop_due(1.0)) == ['a']
+
+
+def test_cancel():
+    q = TaskQueue(0.1)
+    a = q.push(0.1, 'a')
+    q.push(0.1, 'b')
+    q.cancel(a)
+    q.cancel(a)
+    assert len(q) == 1
+    assert list(q.pop_due(0.2)) == ['b']
+    assert not q
+
+
+def test_cancel_after_pop():
+    q = TaskQueue(0.1)
+    a = q.push(0.1, 'a')
+    assert list(q.pop_due(0.2)) == ['a']
+    q.cancel(a)
+    assert len(q) == 0
+
+
+def test_dead():
+    q = TaskQueue(0.1)
+    a = q.push(0.1, 'a')
+    q.push(0.1, 'b')
+    q.cancel(a)
+    assert q.dead() == 1
+    assert list(q.pop_due(0.2)) == ['b']
+    assert q.dead() == 0
+
+
+def test_compact():
+    q = TaskQueue(0.1)
+    entries = [q.push(0.01 * i, i) for i in xrange(2 * COMPACT_MIN_DEAD)]
+    for entry in entries[::2]:
+        q.cancel(entry)
+    assert q.dead() == COMPACT_MIN_DEAD
+    assert list(q.pop_due(0.0)) == []
+    assert q.compactions == 1
+    assert q.dead() == 0
+    assert len(q) == COMPACT_MIN_DEAD
+    assert list(q.pop_due(100.0)) == range(1, 2 * COMPACT_MIN_DEAD, 2)
+
+
+def test_next_time():
+    q = TaskQueue(0.01)
+    assert q.next_time() is None
+    a = q.push(0.5, 'a')
+    q.push(0.52, 'b')
+    q.push(0.51, 'c')
+    q.push(100.0, 'd')
+    assert q.next_time() == 0.5
+    q.cancel(a)
+    assert q.next_time() == 0.51
+    assert list(q.pop_due(0.6)) == ['c', 'b']
+    assert q.next_time() == 100.0
+
+
+def test_pop_due_far_ahead():
+    q = TaskQueue(0.01)
+    q.push(5000.0, 'b')
+    q.push(1.0, 'a')
+    assert list(q.pop_due(1000.0)) == ['a']
+    assert list(q.pop_due(2000.0)) == []
+    assert list(q.pop_due(5000.0)) == ['b']
+
+
+def test_entries():
+    q = TaskQueue(0.01)
+    q.push(5000.0, 'c')
+    a = q.push(0.5, 'a')
+    q.push(0.5, 'b')
+    q.cancel(a)
+    assert [entry[1] for entry in q.entries()] == ['b', 'c']
+
+
+def test():
+
+    print
+    print 'Running TaskQueue test suite...'
+
+    print 'Testing TaskQueue class...'
+    test_pop_due_in_time_order()
+    test_pop_due_in_push_order_within_slot()
+    test_pop_due_within_current_slot()
+    test_push_while_popping()
+    test_push_before_current_slot()
+    test_cancel()
+    test_cancel_after_pop()
+    test_dead()
+    test_compact()
+    test_next_time()
+    test_pop_due_far_ahead()
+    test_entries()
+
+
+if __name__ == '__main__':
+    test()
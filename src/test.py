@@ -19,11 +19,35 @@
 # SOFTWARE.
 
 
+import atlas_test
+import cell_lock_map_test
+import cluster_map_test
+import dstar_lite_test
+import flow_field_test
+import game_test
+import hex_path_finder_test
+import minimap_test
+import path_cache_test
+import picking_index_test
 import proximity_grid_test
+import snapshot_test
+import task_queue_test
 
 
 def main():
+    atlas_test.test()
+    cell_lock_map_test.test()
+    cluster_map_test.test()
+    dstar_lite_test.test()
+    flow_field_test.test()
+    game_test.test()
+    hex_path_finder_test.test()
+    minimap_test.test()
+    path_cache_test.test()
+    picking_index_test.test()
     proximity_grid_test.test()
+    snapshot_test.test()
+    task_queue_test.test()
 
 
 if __name__ == '__main__':